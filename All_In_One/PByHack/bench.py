@@ -0,0 +1,141 @@
+# coding: utf-8
+"""
+爬虫吞吐量基准测试, 完全离线
+
+在临时目录里生成 RepoFarm, 启动 FixtureServer, 然后:
+- crawl:   用 github_blender.search_github 抓取 API 页面并克隆所有仓库
+- scraper: 用 scraper.py 流式解析搜索 HTML 页面并写入 info.txt
+输出 pages/sec, clones/sec 以及峰值内存, 用来调整并发参数和发现性能回退.
+
+    python bench.py --repos 120 --latency 0.05 --clone-workers 8
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from fixture_server import FixtureServer, RepoFarm, PER_PAGE
+
+
+def _peak_rss_mb(who):
+    # Linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(who).ru_maxrss / 1024.0
+
+
+def _measure(func):
+    tracemalloc.start()
+    start = time.time()
+    try:
+        result = func()
+    finally:
+        elapsed = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak / (1024.0 * 1024.0)
+
+
+def bench_crawl(workdir, farm, args):
+    import github_blender
+
+    run_dir = os.path.join(workdir, 'crawl')
+    os.makedirs(run_dir)
+    os.environ.update(farm.git_env())
+    pages = (len(farm.repos) + PER_PAGE - 1) // PER_PAGE
+    with FixtureServer(args.fixtures, farm.items(), latency=args.latency,
+                       rate_limit=args.rate_limit, window=args.window) as server:
+        cwd = os.getcwd()
+        os.chdir(run_dir)
+        try:
+            stats, elapsed, peak = _measure(lambda: github_blender.search_github(
+                'bl_info', page_workers=args.page_workers,
+                clone_workers=args.clone_workers, shallow=not args.full,
+                search_api=server.search_api, pages=pages))
+        finally:
+            os.chdir(cwd)
+        requests_made = server.requests
+    return {
+        'pages': stats['pages'],
+        'clones': stats['repos'],
+        'errors': stats['errors'],
+        'requests': requests_made,
+        'seconds': elapsed,
+        'pages_per_sec': stats['pages'] / elapsed,
+        'clones_per_sec': stats['repos'] / elapsed,
+        'peak_python_mb': peak,
+    }
+
+
+def bench_scraper(workdir, farm, args):
+    import requests
+    from scraper import UrlWriter, parse_stream
+
+    out = os.path.join(workdir, 'info.txt')
+    pages = (len(farm.repos) + PER_PAGE - 1) // PER_PAGE
+
+    def run():
+        links = 0
+        with UrlWriter(out) as writer:
+            for page in range(1, pages + 1):
+                res = requests.get(server.search_html % (page, 'bl_info'), stream=True)
+                res.encoding = 'utf-8'
+                for href in parse_stream(res.iter_content(chunk_size=8192, decode_unicode=True)):
+                    links += 1
+                    writer.add(href)
+        return links, writer.written
+
+    with FixtureServer(args.fixtures, farm.items(), latency=args.latency,
+                       rate_limit=10 ** 9) as server:
+        (links, written), elapsed, peak = _measure(run)
+    return {
+        'pages': pages,
+        'links': links,
+        'written': written,
+        'seconds': elapsed,
+        'pages_per_sec': pages / elapsed,
+        'peak_python_mb': peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repos', type=int, default=60)
+    parser.add_argument('--files', type=int, default=20, help='modules per fixture repo')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--rate-limit', type=int, default=30)
+    parser.add_argument('--window', type=float, default=60.0, help='rate-limit window')
+    parser.add_argument('--page-workers', type=int, default=2)
+    parser.add_argument('--clone-workers', type=int, default=4)
+    parser.add_argument('--full', action='store_true', help='full clones instead of shallow')
+    parser.add_argument('--fixtures', help='directory with recorded api/ and html/ pages')
+    parser.add_argument('--only', choices=('crawl', 'scraper'))
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary directory')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='pbyhack_bench_')
+    try:
+        farm = RepoFarm(os.path.join(workdir, 'farm')).build(args.repos, args.files)
+        report = {}
+        if args.only in (None, 'scraper'):
+            report['scraper'] = bench_scraper(workdir, farm, args)
+        if args.only in (None, 'crawl'):
+            report['crawl'] = bench_crawl(workdir, farm, args)
+        report['peak_rss_mb'] = _peak_rss_mb(resource.RUSAGE_SELF)
+        report['peak_children_rss_mb'] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+        print(json.dumps(report, indent=2))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        if args.keep:
+            print('kept ' + workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
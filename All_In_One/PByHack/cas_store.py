@@ -0,0 +1,144 @@
+# coding: utf-8
+"""
+按内容寻址的去重存储 (可选)
+
+./Download/ 里很多仓库是同一个插件的 fork 或拷贝, 相同的 .py 文件会被保存
+上百次. 开启后每个文件按 sha1 只在 Store/blobs/ 里保存一份, 每个仓库对应
+一个 manifest (相对路径 -> blob), 镜像目录里的文件替换为指向 blob 的硬链接,
+现有工具看到的仍然是普通的目录树. blob 设为只读, 防止通过某个仓库的路径
+改写其它仓库共享的内容.
+
+跨文件系统无法硬链接时退化为复制, 只记录 manifest.
+"""
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import threading
+
+STORE_DIR = './Store/'
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ContentStore(object):
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.manifest_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest[2:])
+
+    def manifest_path(self, name):
+        return os.path.join(self.manifest_dir, name + '.json')
+
+    def _add_blob(self, path, digest):
+        """Make sure the blob exists; returns True if it was new."""
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            return False
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp = '%s.%d.%d.tmp' % (blob, os.getpid(), threading.get_ident())
+        shutil.copyfile(path, tmp)
+        os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        try:
+            # 另一个线程可能已经写入了同一个 blob
+            os.link(tmp, blob)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    def _link(self, blob, path):
+        if os.path.samefile(blob, path):
+            return True
+        tmp = path + '.cas.tmp'
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            return False
+        os.replace(tmp, path)
+        return True
+
+    def ingest(self, repo_dir, name=None):
+        """Move one repo tree into the store and write its manifest."""
+        name = name or os.path.basename(os.path.normpath(repo_dir))
+        manifest = {}
+        new_blobs = 0
+        for root, dirs, files in os.walk(repo_dir):
+            if '.git' in dirs:
+                dirs.remove('.git')
+            for fname in files:
+                path = os.path.join(root, fname)
+                if os.path.islink(path) or not os.path.isfile(path):
+                    continue
+                digest = file_digest(path)
+                new_blobs += self._add_blob(path, digest)
+                self._link(self.blob_path(digest), path)
+                rel = os.path.relpath(path, repo_dir).replace(os.sep, '/')
+                manifest[rel] = [digest, os.path.getsize(path)]
+        tmp = self.manifest_path(name) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp, self.manifest_path(name))
+        return {'files': len(manifest), 'new_blobs': new_blobs}
+
+    def materialize(self, name, target):
+        """Rebuild a read-only view of a repo from its manifest."""
+        with open(self.manifest_path(name)) as f:
+            manifest = json.load(f)
+        for rel, (digest, _) in manifest.items():
+            path = os.path.join(target, *rel.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(path)
+            try:
+                os.link(self.blob_path(digest), path)
+            except OSError:
+                shutil.copyfile(self.blob_path(digest), path)
+                os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    def report(self):
+        """Dedupe ratio: bytes referenced by all manifests / bytes stored."""
+        logical_files = logical_bytes = 0
+        unique = {}
+        for fname in os.listdir(self.manifest_dir):
+            if not fname.endswith('.json'):
+                continue
+            with open(os.path.join(self.manifest_dir, fname)) as f:
+                for digest, size in json.load(f).values():
+                    logical_files += 1
+                    logical_bytes += size
+                    unique[digest] = size
+        stored_bytes = sum(unique.values())
+        return {
+            'files': logical_files,
+            'blobs': len(unique),
+            'logical_bytes': logical_bytes,
+            'stored_bytes': stored_bytes,
+            'file_ratio': float(logical_files) / len(unique) if unique else 1.0,
+            'byte_ratio': float(logical_bytes) / stored_bytes if stored_bytes else 1.0,
+        }
+
+
+if __name__ == '__main__':
+    download_dir = sys.argv[1] if len(sys.argv) > 1 else './Download/'
+    store = ContentStore()
+    for repo in sorted(os.listdir(download_dir)):
+        repo_dir = os.path.join(download_dir, repo)
+        if os.path.isdir(repo_dir):
+            store.ingest(repo_dir, repo)
+    print(json.dumps(store.report(), indent=2))
@@ -0,0 +1,197 @@
+# coding: utf-8
+"""
+插件目录生成器
+
+遍历 ./Download/ 镜像, 用 ast 静态读取每个插件的 bl_info 字典 (不会 import
+任何 bpy 代码), 多进程并行解析, 输出紧凑的目录文件:
+name, version, blender, category 以及文件数量.
+
+增量模式: 按 (mtime, size) 判断文件是否变化, 变化的文件再比较 sha1,
+内容相同则直接沿用上次的解析结果. 每晚同步之后重建索引只会处理改动过的文件.
+镜像经过 cas_store 去重后, 指向同一个 inode 的硬链接只解析一次.
+"""
+import ast
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+DOWNLOAD_DIR = './Download/'
+CATALOG_FILE = './catalog.json'
+STATE_FILE = './catalog_state.json'
+
+# 只在仓库前两层目录里找插件入口
+MAX_DEPTH = 2
+FIELDS = ('name', 'version', 'blender', 'category', 'author', 'description')
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def read_bl_info(source):
+    """Return the bl_info dict literal of a module source, or None."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        if not any(isinstance(t, ast.Name) and t.id == 'bl_info' for t in targets):
+            continue
+        if not isinstance(node.value, ast.Dict):
+            return None
+        # 逐个 key 求值, 个别非字面量的值不影响其它字段
+        info = {}
+        for key, value in zip(node.value.keys, node.value.values):
+            key = _literal(key) if key is not None else None
+            if isinstance(key, str):
+                info[key] = _literal(value)
+        return info
+    return None
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_file(path, old_digest=None):
+    """Worker: hash one file and parse it unless the content is unchanged.
+
+    Returns (path, digest, info, parsed).
+    """
+    try:
+        digest = file_digest(path)
+        if digest == old_digest:
+            return path, digest, None, False
+        with open(path, 'rb') as f:
+            source = f.read()
+    except OSError:
+        return path, None, None, True
+    info = read_bl_info(source) if b'bl_info' in source else None
+    return path, digest, info, True
+
+
+def scan_repo(repo_dir):
+    """Stat every file of one mirrored repo.
+
+    Returns (candidates, counts); candidates maps each .py path that could
+    hold an add-on entry point to (mtime, size, inode).
+    """
+    candidates = {}
+    counts = {'files': 0, 'py_files': 0}
+    base_depth = repo_dir.rstrip(os.sep).count(os.sep)
+    for root, dirs, files in os.walk(repo_dir):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        depth = root.rstrip(os.sep).count(os.sep) - base_depth
+        for name in files:
+            counts['files'] += 1
+            if not name.endswith('.py'):
+                continue
+            counts['py_files'] += 1
+            if depth > MAX_DEPTH:
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            candidates[path] = (st.st_mtime, st.st_size, (st.st_dev, st.st_ino))
+    return candidates, counts
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def build_catalog(download_dir=DOWNLOAD_DIR, catalog_file=CATALOG_FILE,
+                  state_file=STATE_FILE, workers=None):
+    state = load_state(state_file)
+    new_state = {}
+    repo_counts = {}
+    todo = []
+
+    for repo in sorted(os.listdir(download_dir)):
+        repo_dir = os.path.join(download_dir, repo)
+        if not os.path.isdir(repo_dir):
+            continue
+        candidates, counts = scan_repo(repo_dir)
+        repo_counts[repo] = counts
+        for path, (mtime, size, inode) in candidates.items():
+            old = state.get(path)
+            if old and old['mtime'] == mtime and old['size'] == size:
+                new_state[path] = old
+            else:
+                new_state[path] = {'repo': repo, 'mtime': mtime, 'size': size,
+                                   'digest': None, 'info': None}
+                todo.append((path, inode, old['digest'] if old else None,
+                             old['info'] if old else None))
+
+    # 硬链接到同一个 blob 的文件只交给 worker 一次
+    links = {}
+    unique = []
+    for item in todo:
+        if item[1] not in links:
+            unique.append(item)
+        links.setdefault(item[1], []).append(item)
+
+    parsed = 0
+    if unique:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(parse_file, [t[0] for t in unique], [t[2] for t in unique],
+                               chunksize=64)
+            for first, (_, digest, info, was_parsed) in zip(unique, results):
+                parsed += was_parsed
+                if not was_parsed:
+                    info = first[3]
+                for item in links[first[1]]:
+                    entry = new_state[item[0]]
+                    entry['digest'] = digest
+                    entry['info'] = info
+
+    catalog = []
+    for path, entry in sorted(new_state.items()):
+        info = entry['info']
+        if not info:
+            continue
+        item = {'repo': entry['repo'], 'path': os.path.relpath(path, download_dir)}
+        for field in FIELDS:
+            if info.get(field) is not None:
+                item[field] = info[field]
+        item.update(repo_counts[entry['repo']])
+        catalog.append(item)
+
+    with open(catalog_file, 'w') as f:
+        json.dump(catalog, f, separators=(',', ':'), ensure_ascii=False, default=str)
+    save_state(new_state, state_file)
+    print('%d add-ons in %d repos, %d files changed, %d parsed'
+          % (len(catalog), len(repo_counts), len(todo), parsed))
+    return catalog
+
+
+if __name__ == '__main__':
+    build_catalog(*sys.argv[1:2])
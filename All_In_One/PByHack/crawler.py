@@ -0,0 +1,161 @@
+# coding: utf-8
+"""
+并发爬取引擎
+
+搜索页的抓取和仓库的克隆分别放在两个有界的线程池里执行, 一个很慢的
+clone 不会再卡住整个爬取. 请求节奏不再是固定的 time.sleep(10), 而是根据
+GitHub API 返回的 X-RateLimit-Remaining / X-RateLimit-Reset 头, 把剩余
+额度均匀地分配到重置时间之前.
+
+传入 CrawlJournal 时可以断点续爬: 已完成的页不再请求, 上次排队但没有
+完成的仓库会先重新入队.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+
+class RateLimiter(object):
+    """Pace requests from the rate-limit headers of the previous responses."""
+
+    def __init__(self, min_interval=0.0):
+        self.lock = threading.Lock()
+        self.min_interval = min_interval
+        self.interval = min_interval
+        self.remaining = None
+        self.reset_at = 0.0
+        self.next_at = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            delay = max(0.0, self.next_at - now)
+            if self.remaining is not None and self.remaining <= 0:
+                delay = max(delay, self.reset_at - now)
+            self.next_at = now + delay + self.interval
+            if self.remaining is not None:
+                self.remaining -= 1
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def update(self, headers):
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        retry_after = headers.get('Retry-After')
+        with self.lock:
+            now = time.time()
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset_at = float(reset)
+            if retry_after is not None:
+                self.reset_at = max(self.reset_at, now + float(retry_after))
+                self.remaining = 0
+            # 把剩余额度平均摊到窗口结束前
+            if self.remaining and self.reset_at > now:
+                self.interval = max(self.min_interval,
+                                    (self.reset_at - now) / self.remaining)
+            else:
+                self.interval = self.min_interval
+
+
+class CrawlEngine(object):
+    """Fetch search pages and process their repos in separate worker pools.
+
+    ``handle_repo`` is called with each item of ``res.json()['items']`` on
+    the clone pool; its return value is ignored and its exceptions are
+    reported without stopping the crawl.
+    """
+
+    def __init__(self, search_api, handle_repo, page_workers=2,
+                 clone_workers=4, session=None, limiter=None, retries=3,
+                 journal=None):
+        self.search_api = search_api
+        self.handle_repo = handle_repo
+        self.page_workers = page_workers
+        self.clone_workers = clone_workers
+        self.session = session or requests.Session()
+        self.limiter = limiter or RateLimiter()
+        self.retries = retries
+        self.journal = journal
+        self.stats = {'pages': 0, 'repos': 0, 'errors': 0, 'resumed': 0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    def fetch_page(self, keyword, page):
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            res = self.session.get(self.search_api % (keyword, page))
+            self.limiter.update(res.headers)
+            # 403/429 表示额度耗尽, 等到 reset 之后重试
+            if res.status_code in (403, 429) and attempt < self.retries:
+                continue
+            res.raise_for_status()
+            return res.json().get('items', [])
+        return []
+
+    def _run_repo(self, repo):
+        try:
+            self.handle_repo(repo)
+            self._count('repos')
+            if self.journal is not None:
+                self.journal.repo_done(repo['html_url'])
+        except Exception as e:
+            self._count('errors')
+            print('Failed %s: %s' % (repo.get('html_url'), e))
+
+    def make_clone_pool(self):
+        return ThreadPoolExecutor(max_workers=self.clone_workers)
+
+    def crawl(self, keyword, pages=range(1, 21)):
+        journal = self.journal
+        clone_pool = self.make_clone_pool()
+        clone_futures = []
+        submitted = set()
+        failed = False
+        if journal is not None:
+            skip = journal.completed_pages(keyword)
+            pages = [page for page in pages if page not in skip]
+            for repo in journal.pending_repos(keyword):
+                self._count('resumed')
+                submitted.add(repo['html_url'])
+                clone_futures.append(clone_pool.submit(self._run_repo, repo))
+        try:
+            with ThreadPoolExecutor(max_workers=self.page_workers) as page_pool:
+                page_futures = {page_pool.submit(self.fetch_page, keyword, page): page
+                                for page in pages}
+                for future in as_completed(page_futures):
+                    page = page_futures[future]
+                    try:
+                        repo_list = future.result()
+                    except Exception as e:
+                        self._count('errors')
+                        failed = True
+                        print('Page %s failed: %s' % (page, e))
+                        continue
+                    self._count('pages')
+                    for repo in repo_list:
+                        if repo['html_url'] in submitted:
+                            continue
+                        submitted.add(repo['html_url'])
+                        # 先记录入队, 再记录整页完成, 中途崩溃也不会漏掉仓库
+                        if journal is not None:
+                            if journal.is_done(repo['html_url']):
+                                continue
+                            journal.repo_queued(keyword, repo)
+                        clone_futures.append(clone_pool.submit(self._run_repo, repo))
+                    if journal is not None:
+                        journal.page_done(keyword, page)
+            for future in clone_futures:
+                future.result()
+        finally:
+            clone_pool.shutdown(wait=True)
+        if journal is not None and not failed and self.stats['errors'] == 0:
+            journal.finished(keyword)
+        return self.stats
@@ -0,0 +1,213 @@
+# coding: utf-8
+"""
+离线的 GitHub 替身
+
+- FixtureServer: 本地 HTTP 服务, 回放录制好的 search/repositories JSON 和
+  搜索结果 HTML 页面, 可以配置每个请求的延迟以及 X-RateLimit-* 头.
+- RepoFarm: 在本地生成一批 bare 仓库供 clone 使用. 通过 git 的
+  url.<base>.insteadOf 把 https://github.com/ 重写到这些本地仓库,
+  github_blender 的克隆代码不需要任何修改.
+
+录制的数据放在 fixtures 目录下:
+    api/page_<n>.json     search/repositories 的响应
+    html/page_<n>.html    github.com/search 的页面
+没有录制数据时, 根据 RepoFarm 里的仓库生成响应.
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+GITHUB = 'https://github.com/'
+PER_PAGE = 30
+
+
+class RepoFarm(object):
+    """A directory of bare repos laid out as <root>/<owner>/<name>.git."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.repos = []
+
+    def _git(self, *args, **kwargs):
+        subprocess.run(('git',) + args, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, **kwargs)
+
+    def build(self, count=50, files=20, owner='fixture'):
+        """Create ``count`` repos with ``files`` small add-on modules each."""
+        env = dict(os.environ, GIT_AUTHOR_NAME='fixture', GIT_AUTHOR_EMAIL='fixture@localhost',
+                   GIT_COMMITTER_NAME='fixture', GIT_COMMITTER_EMAIL='fixture@localhost')
+        for i in range(count):
+            name = 'addon_%04d' % i
+            bare = os.path.join(self.root, owner, name + '.git')
+            self.repos.append((owner, name))
+            if os.path.exists(bare):
+                continue
+            work = bare[:-len('.git')] + '.work'
+            self._git('init', '-q', '-b', 'main', work)
+            with open(os.path.join(work, '__init__.py'), 'w') as f:
+                f.write('bl_info = {"name": "%s", "version": (1, %d), '
+                        '"blender": (2, 80, 0), "category": "Mesh"}\n' % (name, i))
+            for j in range(files):
+                with open(os.path.join(work, 'module_%02d.py' % j), 'w') as f:
+                    f.write('# %s module %d\n' % (name, j) + 'VALUE = %d\n' % j * 50)
+            with open(os.path.join(work, 'README.md'), 'w') as f:
+                f.write('# %s\n' % name)
+            with open(os.path.join(work, 'texture.bin'), 'wb') as f:
+                f.write(os.urandom(64 * 1024))
+            self._git('add', '-A', cwd=work, env=env)
+            self._git('commit', '-q', '-m', 'init', cwd=work, env=env)
+            self._git('clone', '-q', '--bare', work, bare)
+            self._git('config', 'uploadpack.allowFilter', 'true', cwd=bare)
+            self._git('config', 'uploadpack.allowAnySHA1InWant', 'true', cwd=bare)
+            shutil.rmtree(work)
+        return self
+
+    def git_env(self):
+        """Environment that redirects github.com clones into the farm."""
+        env = {
+            'GIT_CONFIG_COUNT': '2',
+            'GIT_CONFIG_KEY_0': 'url.file://%s/.insteadOf' % self.root,
+            'GIT_CONFIG_VALUE_0': GITHUB,
+            'GIT_CONFIG_KEY_1': 'protocol.file.allow',
+            'GIT_CONFIG_VALUE_1': 'always',
+        }
+        return env
+
+    def items(self):
+        return [{
+            'html_url': GITHUB + '%s/%s' % (owner, name),
+            'description': 'fixture add-on %s' % name,
+            'stargazers_count': i,
+            'pushed_at': '2020-01-01T00:00:00Z',
+            'default_branch': 'main',
+        } for i, (owner, name) in enumerate(self.repos)]
+
+
+class FixtureServer(object):
+    """Serve recorded or synthesized search responses on localhost."""
+
+    def __init__(self, fixtures=None, items=(), latency=0.0, rate_limit=30,
+                 window=60.0, port=0):
+        self.fixtures = fixtures
+        self.items = list(items)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.window_start = time.time()
+        self.used = 0
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.httpd.server_address[1]
+
+    @property
+    def search_api(self):
+        return self.url + '/search/repositories?q=%s&type=Code&sort=updated&order=desc&page=%s'
+
+    @property
+    def search_html(self):
+        return self.url + '/search?p=%s&q=%s&type=Code'
+
+    def rate_headers(self):
+        with self.lock:
+            now = time.time()
+            self.requests += 1
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.used = 0
+            self.used += 1
+            remaining = self.rate_limit - self.used
+            reset = self.window_start + self.window
+        return remaining, {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(max(0, remaining)),
+            'X-RateLimit-Reset': '%.3f' % reset,
+        }
+
+    def _recorded(self, kind, page):
+        if not self.fixtures:
+            return None
+        ext = 'json' if kind == 'api' else 'html'
+        path = os.path.join(self.fixtures, kind, 'page_%d.%s' % (page, ext))
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def api_page(self, page):
+        body = self._recorded('api', page)
+        if body is None:
+            chunk = self.items[(page - 1) * PER_PAGE:page * PER_PAGE]
+            body = json.dumps({'total_count': len(self.items), 'items': chunk}).encode('utf-8')
+        return body
+
+    def html_page(self, page):
+        body = self._recorded('html', page)
+        if body is None:
+            chunk = self.items[(page - 1) * PER_PAGE:page * PER_PAGE]
+            rows = ''.join('<div class="code-list-item"><h3>\n<a href="%s">%s</a>\n</h3>'
+                           '<p>%s</p></div>\n'
+                           % (item['html_url'][len(GITHUB) - 1:], item['html_url'],
+                              'x' * 2000) for item in chunk)
+            body = ('<html><body>%s</body></html>' % rows).encode('utf-8')
+        return body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                remaining, headers = server.rate_headers()
+                if remaining < 0:
+                    self.send_response(403)
+                    body = b'{"message": "API rate limit exceeded"}'
+                elif parts.path == '/search/repositories':
+                    self.send_response(200)
+                    body = server.api_page(int(query.get('page', ['1'])[0]))
+                    headers['Content-Type'] = 'application/json'
+                elif parts.path == '/search':
+                    self.send_response(200)
+                    body = server.html_page(int(query.get('p', ['1'])[0]))
+                    headers['Content-Type'] = 'text/html; charset=utf-8'
+                else:
+                    self.send_response(404)
+                    body = b''
+                headers['Content-Length'] = str(len(body))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,103 @@
+# coding: utf-8
+"""
+浅克隆模式: depth=1 + blob:none 的部分克隆, 配合 sparse-checkout 只检出
+*.py 和仓库根目录下的元数据文件 (README, LICENSE 等). 我们只需要 Python
+源码和 bl_info, 不需要历史和美术资源.
+
+克隆/更新在进程池里执行, 并发数可配置. 默认分支从远端检测, 不再假定 master.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from git import GitCommandError, Repo
+
+CLONE_OPTIONS = ['--depth=1', '--filter=blob:none', '--no-checkout']
+
+SPARSE_PATTERNS = [
+    '*.py',
+    '/README*',
+    '/LICENSE*',
+    '/COPYING*',
+    '/*.md',
+    '/*.txt',
+    '/*.cfg',
+    '/*.toml',
+    '/*.json',
+]
+
+
+def default_branch(repo, remote='origin'):
+    """Detect the remote's default branch instead of assuming master.
+
+    Returns None on a detached HEAD with no branch name to be found.
+    """
+    out = repo.git.ls_remote('--symref', remote, 'HEAD')
+    for line in out.splitlines():
+        # ref: refs/heads/main\tHEAD
+        if line.startswith('ref:'):
+            return line.split()[1][len('refs/heads/'):]
+    # 远端没有给出 symref 时, 用克隆时记录的 origin/HEAD
+    try:
+        ref = repo.git.symbolic_ref('--short', 'refs/remotes/%s/HEAD' % remote)
+        return ref[len(remote) + 1:]
+    except GitCommandError:
+        pass
+    # --no-checkout 的浅克隆常常是 detached HEAD, 没有分支名
+    if repo.head.is_detached:
+        return None
+    return repo.active_branch.name
+
+
+def shallow_clone(url, path, branch=None):
+    options = list(CLONE_OPTIONS)
+    if branch:
+        options.append('--branch=' + branch)
+    repo = Repo.clone_from(url=url, to_path=path, multi_options=options)
+    repo.git.sparse_checkout('set', '--no-cone', *SPARSE_PATTERNS)
+    repo.git.checkout()
+    return repo
+
+
+def shallow_update(path, branch=None):
+    repo = Repo(path)
+    branch = branch or default_branch(repo)
+    repo.git.fetch('--depth=1', '--filter=blob:none', 'origin', branch or 'HEAD')
+    if branch is None:
+        # 找不到分支名, 直接 detached 检出远端 HEAD
+        repo.git.checkout('-f', '--detach', 'FETCH_HEAD')
+    else:
+        repo.git.checkout('-f', '-B', branch, 'FETCH_HEAD')
+    return repo
+
+
+def full_update(path, branch=None):
+    repo = Repo(path)
+    branch = branch or default_branch(repo)
+    if branch is None:
+        repo.git.fetch('origin', 'HEAD')
+        repo.git.checkout('-f', '--detach', 'FETCH_HEAD')
+        return repo
+    repo.git.checkout(branch)
+    repo.remotes[0].pull()
+    return repo
+
+
+def sync(url, path, branch=None, shallow=True, exists=False):
+    """Clone or update one mirror; returns the checked-out commit sha.
+
+    Runs inside a worker process, so it only takes and returns picklable
+    values.
+    """
+    if not exists:
+        if shallow:
+            repo = shallow_clone(url, path, branch)
+        else:
+            repo = Repo.clone_from(url=url, to_path=path)
+    elif shallow:
+        repo = shallow_update(path, branch)
+    else:
+        repo = full_update(path, branch)
+    return repo.head.commit.hexsha
+
+
+def make_pool(max_workers=4):
+    return ProcessPoolExecutor(max_workers=max_workers)
@@ -1,49 +1,82 @@
 # coding: utf-8
-import time
-import json
-import requests
-from git import Repo
-#from db import REDIS
 import os
+
+import git_mirror
+from cas_store import ContentStore
+from crawler import CrawlEngine
+from journal import CrawlJournal
+from repo_index import RepoIndex
+
 REPO_SHOW = '1'
 REPO_HIDDEN = '0'
 
 SEARCH_API = 'https://api.github.com/search/repositories?q=%s&type=Code&sort=updated&order=desc&page=%s'
+INDEX_DB = './repos.db'
+JOURNAL = './crawl.journal'
 
-def download_dataset(dataset_url):
-    local_git = './Download/'+dataset_url.split('/')[4]
-    if not os.path.exists(local_git):
-        repo = Repo.clone_from(url=dataset_url+'.git', to_path=local_git)
-        print("Downloaded")
-    else:
+def local_path(dataset_url):
+    return './Download/'+dataset_url.split('/')[4]
+
+def download_dataset(dataset_url, branch=None, shallow=False, pool=None):
+    # 返回同步后的 commit; 传入 pool 时 git 操作在进程池里执行
+    local_git = local_path(dataset_url)
+    exists = os.path.exists(local_git)
+    if exists:
         print("Repo exists, pulling latest")
-        repo = Repo(local_git)
-        git = repo.git
-        git.checkout("master")
-        repo.remotes[0].pull()
-    return repo
-
-def search_github(keyword):
-    # 爬取 20 页最新的列表
-    for i in range(1, 21):
-        res = requests.get(SEARCH_API % (keyword, i))
-        repo_list = res.json()['items']
-        for repo in repo_list:
-            repo_name = repo['html_url']
-            desc = {
-                'repo_desc': repo['description'],
-                'star': repo['stargazers_count'],
-                'is_show': REPO_SHOW
-            }
-
-            #if REDIS.hsetnx('repos', repo_name, json.dumps(desc)):
-            download_dataset(repo_name)
-            print(repo_name)
-        time.sleep(10)
+    args = (dataset_url+'.git', local_git, branch, shallow, exists)
+    if pool is None:
+        commit = git_mirror.sync(*args)
+    else:
+        commit = pool.submit(git_mirror.sync, *args).result()
+    if not exists:
+        print("Downloaded")
+    return commit
+
+def handle_repo(repo, index, pool=None, shallow=True, store=None):
+    repo_name = repo['html_url']
+    pushed_at = repo.get('pushed_at')
+    index.update(repo, is_show=REPO_SHOW)
+
+    # 远端自上次同步以来没有变化, 跳过 clone/pull
+    if os.path.exists(local_path(repo_name)) and not index.needs_sync(repo_name, pushed_at):
+        print("Unchanged, skipping " + repo_name)
+        return
+    commit = download_dataset(repo_name, branch=repo.get('default_branch'),
+                              shallow=shallow, pool=pool)
+    index.mark_synced(repo_name, pushed_at, commit)
+    if store is not None:
+        # 相同内容的文件只在 Store/ 里保存一份, 镜像里换成硬链接
+        store.ingest(local_path(repo_name))
+    print(repo_name)
+
+def search_github(keyword, page_workers=2, clone_workers=4, index_db=INDEX_DB,
+                  shallow=True, journal_path=JOURNAL, dedupe=False,
+                  search_api=SEARCH_API, pages=20):
+    # 默认爬取 20 页最新的列表, 抓取和克隆分别并发, 节奏由 rate-limit 头控制
+    # clone_workers 同时限制 git 进程池的大小
+    # 中断后重新运行会从日志里记录的位置继续
+    index = RepoIndex(index_db)
+    journal = CrawlJournal(journal_path)
+    pool = git_mirror.make_pool(clone_workers)
+    store = ContentStore() if dedupe else None
+    engine = CrawlEngine(search_api,
+                         lambda repo: handle_repo(repo, index, pool, shallow, store),
+                         page_workers=page_workers,
+                         clone_workers=clone_workers,
+                         journal=journal)
+    try:
+        stats = engine.crawl(keyword, pages=range(1, pages + 1))
+    finally:
+        pool.shutdown(wait=True)
+        journal.close()
+        index.close()
+    if store is not None:
+        stats['dedupe'] = store.report()
+    print(stats)
+    return stats
 
 
 if __name__ == '__main__':
     keywords = ['bl_info']
-    #REDIS.set('keywords', ' '.join(keywords))
     for keyword in keywords:
         search_github(keyword)
@@ -0,0 +1,94 @@
+# coding: utf-8
+"""
+可恢复的爬取日志
+
+只追加的 JSON Lines 文件, 记录三类事件:
+  page     某个关键词的某一页已经抓取完成
+  queued   某个仓库已经进入克隆队列 (保存完整的搜索结果条目)
+  done     某个仓库已经同步完成
+一个关键词整轮爬取结束后写入 finished, 重放时清空该关键词的状态, 下一轮
+从头开始. 重放是幂等的, 重复的记录不会产生影响; 写了一半的最后一行会被忽略.
+"""
+import json
+import os
+import threading
+
+
+class CrawlJournal(object):
+
+    def __init__(self, path='./crawl.journal', fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.queued = {}
+        self.done = set()
+        self.replay()
+        # 上一轮全部完成时截断日志, 避免文件无限增长
+        mode = 'a' if self.pages or self.queued else 'w'
+        if mode == 'w':
+            self.done.clear()
+        self.file = open(path, mode, encoding='utf-8')
+
+    def replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.apply(record)
+
+    def apply(self, record):
+        ev = record.get('ev')
+        keyword = record.get('keyword')
+        if ev == 'page':
+            self.pages.setdefault(keyword, set()).add(record['page'])
+        elif ev == 'queued':
+            self.queued.setdefault(keyword, {})[record['repo']['html_url']] = record['repo']
+        elif ev == 'done':
+            self.done.add(record['url'])
+        elif ev == 'finished':
+            self.pages.pop(keyword, None)
+            for url in self.queued.pop(keyword, {}):
+                self.done.discard(url)
+
+    def write(self, record):
+        with self.lock:
+            self.apply(record)
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+
+    def page_done(self, keyword, page):
+        self.write({'ev': 'page', 'keyword': keyword, 'page': page})
+
+    def repo_queued(self, keyword, repo):
+        self.write({'ev': 'queued', 'keyword': keyword, 'repo': repo})
+
+    def repo_done(self, url):
+        self.write({'ev': 'done', 'url': url})
+
+    def finished(self, keyword):
+        self.write({'ev': 'finished', 'keyword': keyword})
+
+    def completed_pages(self, keyword):
+        with self.lock:
+            return set(self.pages.get(keyword, ()))
+
+    def pending_repos(self, keyword):
+        """Repos queued in an earlier run that never finished syncing."""
+        with self.lock:
+            return [repo for url, repo in self.queued.get(keyword, {}).items()
+                    if url not in self.done]
+
+    def is_done(self, url):
+        with self.lock:
+            return url in self.done
+
+    def close(self):
+        with self.lock:
+            self.file.close()
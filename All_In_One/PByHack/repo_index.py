@@ -0,0 +1,79 @@
+# coding: utf-8
+"""
+本地持久化的仓库索引 (SQLite), 代替原来注释掉的 REDIS.hsetnx 去重.
+
+以 html_url 为主键, 记录描述, star 数, pushed_at 以及上次同步时的 commit.
+只有远端 pushed_at 变化过的仓库才需要重新 clone/pull.
+"""
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS repos (
+    html_url         TEXT PRIMARY KEY,
+    description      TEXT,
+    stars            INTEGER,
+    pushed_at        TEXT,
+    is_show          TEXT,
+    synced_pushed_at TEXT,
+    synced_commit    TEXT,
+    synced_at        REAL
+)
+'''
+
+
+class RepoIndex(object):
+    """SQLite-backed repo index shared by the crawler's worker threads."""
+
+    def __init__(self, path='repos.db'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def update(self, repo, is_show='1'):
+        """Store the metadata of a search result item."""
+        with self.lock:
+            self.conn.execute(
+                '''INSERT INTO repos (html_url, description, stars, pushed_at, is_show)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(html_url) DO UPDATE SET
+                       description = excluded.description,
+                       stars = excluded.stars,
+                       pushed_at = excluded.pushed_at''',
+                (repo['html_url'], repo.get('description'),
+                 repo.get('stargazers_count'), repo.get('pushed_at'), is_show))
+            self.conn.commit()
+
+    def needs_sync(self, html_url, pushed_at):
+        """True unless the repo was synced and its remote has not moved since."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT synced_pushed_at, synced_commit FROM repos WHERE html_url = ?',
+                (html_url,)).fetchone()
+        if row is None or row[1] is None:
+            return True
+        return pushed_at is None or row[0] != pushed_at
+
+    def mark_synced(self, html_url, pushed_at, commit):
+        with self.lock:
+            self.conn.execute(
+                '''UPDATE repos SET synced_pushed_at = ?, synced_commit = ?, synced_at = ?
+                   WHERE html_url = ?''',
+                (pushed_at, commit, time.time(), html_url))
+            self.conn.commit()
+
+    def get(self, html_url):
+        with self.lock:
+            cur = self.conn.execute('SELECT * FROM repos WHERE html_url = ?', (html_url,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return dict(zip([c[0] for c in cur.description], row))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,101 @@
+# coding: utf-8
+"""
+test.py 的抓取阶段
+
+- SearchPageParser: 基于 html.parser 的增量解析器, 边下载边解析,
+  收集 <h3> 里的链接, 不需要把整页转成字符串再用正则扫描.
+- UrlWriter: 对 URL 做规范化, 和 info.txt 里已有的内容以及本次抓到的
+  内容去重, 按批写入文件.
+"""
+import os
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+GITHUB = 'https://github.com'
+
+
+def normalize_url(href, base=GITHUB):
+    """Absolute https URL without query, fragment or trailing slash."""
+    parts = urlsplit(urljoin(base + '/', href.strip()))
+    path = parts.path.rstrip('/')
+    return urlunsplit(('https', parts.netloc.lower(), path, '', ''))
+
+
+class SearchPageParser(HTMLParser):
+    """Collect the hrefs of links inside <h3> elements, fed chunk by chunk."""
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.depth = 0
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h3':
+            self.depth += 1
+        elif tag == 'a' and self.depth:
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+
+    def handle_endtag(self, tag):
+        if tag == 'h3' and self.depth:
+            self.depth -= 1
+
+    def pop_links(self):
+        links, self.links = self.links, []
+        return links
+
+
+def parse_stream(chunks):
+    """Yield links as soon as the chunk containing them has been parsed."""
+    parser = SearchPageParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        for link in parser.pop_links():
+            yield link
+    parser.close()
+    for link in parser.pop_links():
+        yield link
+
+
+class UrlWriter(object):
+    """Append unseen, normalised URLs to a file in batches."""
+
+    def __init__(self, path='info.txt', batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self.seen = set()
+        self.pending = []
+        self.written = 0
+        self.duplicates = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self.seen.add(normalize_url(line))
+
+    def add(self, href):
+        url = normalize_url(href)
+        if url in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen.add(url)
+        self.pending.append(url + '\n')
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        if not self.pending:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(self.pending)
+        self.written += len(self.pending)
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
@@ -1,8 +1,9 @@
 #coding=utf-8
-import re
 import requests
 import random
 
+from scraper import UrlWriter, normalize_url, parse_stream
+
 
 # 设置代理
 proxy_list = [
@@ -16,27 +17,21 @@ proxy = random.choice(proxy_list)
 print('The proxy is:'+str(proxy))
 
 # 主程序
-f = open('info.txt','a')
 num = 0
-for i in range(10):
-	data = i + 1
-	url = 'https://github.com/search?p='+str(data)+'&q=bl_info&type=Code'
-	print(url)
-	head = {'User-Agent':'Mozilla/5.0 (Windows NT 10.0; …) Gecko/20100101 Firefox/61.0'}
-	htmls = requests.get(url)#,headers = head,proxies=proxy)
-	htmls.encoding = 'utf-8'
-	html = htmls.content
+with UrlWriter('info.txt', batch_size=100) as writer:
+	for i in range(10):
+		data = i + 1
+		url = 'https://github.com/search?p='+str(data)+'&q=bl_info&type=Code'
+		print(url)
+		head = {'User-Agent':'Mozilla/5.0 (Windows NT 10.0; …) Gecko/20100101 Firefox/61.0'}
+		htmls = requests.get(url, stream=True)#,headers = head,proxies=proxy)
+		htmls.encoding = 'utf-8'
 
-	##正则匹配
-	findtexts = re.findall('<h3>(.*?)</h3>',str(html),re.S)
-	
-	##找到关键词并写入文件
-	print('For [ '+str(data)+' ] Page')
-	for findtext in findtexts:
-		findurl = re.findall('href="(.*?)">',findtext)
-		for each in findurl:
+		##边下载边解析, 找到 <h3> 里的链接, 去重后按批写入文件
+		print('For [ '+str(data)+' ] Page')
+		for each in parse_stream(htmls.iter_content(chunk_size=8192, decode_unicode=True)):
 			num += 1
-			print('https://github.com'+each)
-			f.writelines('https://github.com'+each+'\n')
+			if writer.add(each):
+				print(normalize_url(each))
 print(num)
-f.close()
+print('new: '+str(writer.written)+', duplicates: '+str(writer.duplicates))
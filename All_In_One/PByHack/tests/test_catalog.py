@@ -0,0 +1,83 @@
+# coding: utf-8
+"""
+catalog 的离线检查: bl_info 解析和增量构建
+
+    python -m unittest discover -s All_In_One/PByHack/tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import build_catalog, read_bl_info
+
+
+class TempDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+ADDON = b'''
+import bpy
+
+bl_info = {
+    "name": "Fixture",
+    "version": (1, 2, 3),
+    "blender": (2, 80, 0),
+    "category": "Mesh",
+    "description": "x" + "y",
+    "author": AUTHOR,
+}
+'''
+
+
+class CatalogTest(TempDirTest):
+
+    def test_read_bl_info(self):
+        info = read_bl_info(ADDON)
+        self.assertEqual(info['name'], 'Fixture')
+        self.assertEqual(info['version'], (1, 2, 3))
+        self.assertEqual(info['blender'], (2, 80, 0))
+        # 非字面量的字段单独变成 None
+        self.assertIsNone(info['author'])
+        self.assertIsNone(info['description'])
+
+    def test_read_bl_info_without_dict(self):
+        self.assertIsNone(read_bl_info(b'import bpy\n'))
+        self.assertIsNone(read_bl_info(b'bl_info = make_info()\n'))
+        self.assertIsNone(read_bl_info(b'def broken(:\n'))
+        self.assertEqual(read_bl_info(b'bl_info: dict = {"name": "A"}\n'), {'name': 'A'})
+
+    def test_build_catalog_incremental(self):
+        download = os.path.join(self.dir, 'Download')
+        os.makedirs(os.path.join(download, 'addon_a'))
+        with open(os.path.join(download, 'addon_a', '__init__.py'), 'wb') as f:
+            f.write(ADDON)
+        with open(os.path.join(download, 'addon_a', 'README.md'), 'w') as f:
+            f.write('# addon_a\n')
+        catalog_file = os.path.join(self.dir, 'catalog.json')
+        state_file = os.path.join(self.dir, 'state.json')
+
+        catalog = build_catalog(download, catalog_file, state_file, workers=1)
+        self.assertEqual(len(catalog), 1)
+        self.assertEqual(catalog[0]['name'], 'Fixture')
+        self.assertEqual(catalog[0]['files'], 2)
+        self.assertEqual(catalog[0]['py_files'], 1)
+        with open(catalog_file) as f:
+            self.assertEqual(json.load(f)[0]['repo'], 'addon_a')
+
+        # 没有改动时沿用上次的解析结果 (从 JSON 状态读回, 元组变成列表)
+        again = build_catalog(download, catalog_file, state_file, workers=1)
+        self.assertEqual(again, json.loads(json.dumps(catalog)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# coding: utf-8
+"""
+CrawlJournal 的离线检查: 断点续爬的重放
+
+    python -m unittest discover -s All_In_One/PByHack/tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import CrawlJournal
+
+
+def repo(i):
+    return {'html_url': 'https://github.com/fixture/addon_%04d' % i,
+            'description': 'addon %d' % i, 'stargazers_count': i,
+            'pushed_at': '2020-01-01T00:00:00Z'}
+
+
+class TempDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+class JournalTest(TempDirTest):
+
+    def test_replay_resumes_unfinished_keyword(self):
+        path = os.path.join(self.dir, 'crawl.journal')
+        journal = CrawlJournal(path)
+        journal.page_done('blender', 1)
+        journal.repo_queued('blender', repo(1))
+        journal.repo_queued('blender', repo(2))
+        journal.repo_done(repo(1)['html_url'])
+        journal.close()
+        # 崩溃时写了一半的最后一行
+        with open(path, 'a') as f:
+            f.write('{"ev": "page", "keyw')
+
+        journal = CrawlJournal(path)
+        self.assertEqual(journal.completed_pages('blender'), {1})
+        self.assertEqual(journal.pending_repos('blender'), [repo(2)])
+        self.assertTrue(journal.is_done(repo(1)['html_url']))
+        journal.close()
+
+    def test_replay_is_idempotent(self):
+        path = os.path.join(self.dir, 'crawl.journal')
+        journal = CrawlJournal(path)
+        for _ in range(3):
+            journal.page_done('blender', 2)
+            journal.repo_queued('blender', repo(3))
+        journal.close()
+        journal = CrawlJournal(path)
+        self.assertEqual(journal.completed_pages('blender'), {2})
+        self.assertEqual(journal.pending_repos('blender'), [repo(3)])
+        journal.close()
+
+    def test_finished_round_starts_over(self):
+        path = os.path.join(self.dir, 'crawl.journal')
+        journal = CrawlJournal(path)
+        journal.page_done('blender', 1)
+        journal.repo_queued('blender', repo(1))
+        journal.repo_done(repo(1)['html_url'])
+        journal.finished('blender')
+        journal.close()
+        journal = CrawlJournal(path)
+        self.assertEqual(journal.completed_pages('blender'), set())
+        self.assertEqual(journal.pending_repos('blender'), [])
+        self.assertFalse(journal.is_done(repo(1)['html_url']))
+        journal.close()
+        # 整轮结束后日志被截断
+        self.assertEqual(os.path.getsize(path), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
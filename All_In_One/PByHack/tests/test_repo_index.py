@@ -0,0 +1,66 @@
+# coding: utf-8
+"""
+repo_index 的离线检查, 不需要网络和 requests
+
+    python -m unittest discover -s All_In_One/PByHack/tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repo_index import RepoIndex
+
+
+def repo(i):
+    return {'html_url': 'https://github.com/fixture/addon_%04d' % i,
+            'description': 'addon %d' % i, 'stargazers_count': i,
+            'pushed_at': '2020-01-01T00:00:00Z'}
+
+
+class TempDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+class RepoIndexTest(TempDirTest):
+
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.index = RepoIndex(os.path.join(self.dir, 'repos.db'))
+
+    def tearDown(self):
+        self.index.close()
+        TempDirTest.tearDown(self)
+
+    def test_upsert_keeps_sync_state(self):
+        url = repo(1)['html_url']
+        self.index.update(repo(1), is_show='0')
+        self.assertTrue(self.index.needs_sync(url, '2020-01-01T00:00:00Z'))
+        self.index.mark_synced(url, '2020-01-01T00:00:00Z', 'abc123')
+        self.assertFalse(self.index.needs_sync(url, '2020-01-01T00:00:00Z'))
+
+        changed = dict(repo(1), description='new', stargazers_count=99)
+        self.index.update(changed, is_show='1')
+        row = self.index.get(url)
+        self.assertEqual(row['description'], 'new')
+        self.assertEqual(row['stars'], 99)
+        # is_show 和同步记录不会被 upsert 覆盖
+        self.assertEqual(row['is_show'], '0')
+        self.assertEqual(row['synced_commit'], 'abc123')
+        self.assertTrue(self.index.needs_sync(url, '2021-01-01T00:00:00Z'))
+
+    def test_unknown_repo(self):
+        self.assertIsNone(self.index.get('https://github.com/nobody/nothing'))
+        self.assertTrue(self.index.needs_sync('https://github.com/nobody/nothing', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 
 from math import pi, sin, cos
+import numpy as np
 import bpy
 from bpy.props import *
 from bpy_extras import object_utils
@@ -88,90 +89,283 @@ class honeycomb_geometry():
             co.append((cp[0] + cos(a) * self.r, cp[1] + sin(a) * self.r, cp[2]))
         return co, ap
     
-    def generate(self):
-        ar = 1
-        ac = 1
+    # faces around the cell s, from its left (l), upper (u) and lower (d)
+    # neighbours, as (cell, corner) pairs
+    FACES_BELOW = ((('s', 1), ('u', 5), ('u', 4), ('s', 2)),
+                   (('s', 2), ('u', 4), ('l', 0)))
+    FACES_LEFT = ((('s', 2), ('l', 0), ('l', 5), ('s', 3)),)
+    FACES_ABOVE = ((('s', 3), ('l', 5), ('d', 1)),
+                   (('s', 3), ('d', 1), ('d', 0), ('s', 4)))
+    FACES_ALL = FACES_BELOW + FACES_LEFT + FACES_ABOVE
 
-        cells = []
-        verts = []
-        faces = []
-        
-        for row in range(-ar, self.rows + ar):
-            level = []
-            for col in range(-ac, self.cols + ac):
-                co, ap = self.cell(row, col, len(verts))
-                verts += co
-                level.append(ap)
-            cells.append(level)
-        
+    # rows and cols below are grid indexes: the cells plus one cell of border
+    # all around, so grid row 0 is row -1 of vert() and cell()
+
+    def grid(self):
+        return self.rows + 2, self.cols + 2
+
+    def corners(self, r0, r1, c0, c1):
+        """
+        :return: bool array [row, col, corner] of the vertexes of the grid
+            cells r0:r1, c0:c1. Only the border cells are partial.
+        """
+        nr, nc = self.grid()
+        mask = np.zeros((r1 - r0, c1 - c0, 6), dtype=bool)
+        mask[max(r0, 1) - r0:min(r1, nr - 1) - r0, max(c0, 1) - c0:min(c1, nc - 1) - c0] = True
+        border = set((row, col) for row in (0, nr - 1) if r0 <= row < r1 for col in range(c0, c1))
+        border.update((row, col) for col in (0, nc - 1) if c0 <= col < c1 for row in range(r0, r1))
+        for row, col in border:
+            mask[row - r0, col - c0, self.vert(row - 1, col - 1)] = True
+        return mask
+
+    def centres(self, r0, r1, c0, c1):
+        """
+        :return: x, y arrays [row, col] of the cell central points
+        """
+        rows = np.arange(r0, r1) - 1
+        cols = np.arange(c0, c1) - 1
+        x = (self.sx + self.dx * cols)[None, :] + np.where(rows % 2, self.gx, 0.0)[:, None]
+        y = np.broadcast_to((self.sy + self.dy * rows)[:, None], x.shape)
+        return x, y
+
+    def coords(self, mask, r0, r1, c0, c1):
+        """
+        :return: (n, 3) coordinates of the vertexes of mask, in its order
+        """
+        angles = [pi / 6 + i * pi / 3 for i in range(6)]
+        ox = np.array([cos(a) * self.r for a in angles])
+        oy = np.array([sin(a) * self.r for a in angles])
+        x, y = self.centres(r0, r1, c0, c1)
+        co = np.zeros((np.count_nonzero(mask), 3))
+        co[:, 0] = (x[:, :, None] + ox)[mask]
+        co[:, 1] = (y[:, :, None] + oy)[mask]
+        return co
+
+    def faces(self, index, rows, cols, templates, include=None, origin=(0, 0)):
+        """
+        Faces of the cells (rows, cols), cell by cell
+        :param index: vertex indexes [row, col, corner] of the grid cells
+            from origin on
+        :param templates: faces as (cell, corner) pairs, see FACES_BELOW
+        :param include: optional bool array [cell, template]
+        :return: loops, sizes
+        """
+        rows = np.asarray(rows).ravel()
+        cols = np.asarray(cols).ravel()
+        cs = rows % 2
+        rows = rows - origin[0]
+        cols = cols - origin[1]
+        cells = {
+            's': (rows, cols),
+            'l': (rows, cols - 1),
+            'u': (rows + 1, cols - cs),
+            'd': (rows - 1, cols - cs),
+        }
+        if include is None:
+            include = np.ones((len(rows), len(templates)), dtype=bool)
+        include = np.asarray(include, dtype=bool)
+        padded = np.full((len(rows), len(templates), 4), -1, dtype=np.int64)
+        for f, face in enumerate(templates):
+            # neighbours of faces left out may be off the index grid
+            keep = include[:, f]
+            for k, (cell, corner) in enumerate(face):
+                r, c = cells[cell]
+                padded[keep, f, k] = index[r[keep], c[keep], corner]
+        sizes = np.tile([len(face) for face in templates], len(rows))
+        keep = include.ravel()
+        padded = padded.reshape(-1, 4)[keep]
+        sizes = sizes[keep]
+        loops = padded[padded >= 0]
+        return loops, sizes
+
+    def face_mask(self, rows, cols):
+        """
+        Which of FACES_ALL each grid cell (rows, cols) owns, the rules of
+        arrays() cell by cell
+        :return: bool array [cell, template]
+        """
+        nr, nc = self.grid()
+        rows = np.asarray(rows).ravel()[:, None]
+        cols = np.asarray(cols).ravel()[:, None]
+        odd = (rows % 2).astype(bool)
+        below = np.array([[True, True, False, False, False]])
+        above = np.array([[False, False, False, True, True]])
+        inner = (cols >= 1) & (cols < nc - 1)
+        right = (cols == nc - 1) & (rows >= 1) & (rows < nr - 1)
+
+        include = np.zeros((len(rows), 5), dtype=bool)
+        include |= (rows == 0) & inner & below
+        include |= (rows == nr - 1) & inner & (cols >= 1 + (nr - 1) % 2) & above
+        include |= (rows >= 1) & (rows < nr - 1) & inner
+        include |= right & np.array([[False, True, True, True, False]])
+        include[:, :1] |= right & odd & (rows < nr - 2)
+        include[:, 4:] |= right & odd & (rows > 1)
+        if not self.rows % 2:
+            include |= (rows == nr - 1) & (cols == nc - 1) & above
+        return include
+
+    def arrays(self):
+        """
+        Same mesh as generate(), as arrays for foreach_set
+        :return: co (n, 3) float, loops and sizes (polygon loop totals) int
+        """
+        nr, nc = self.grid()
+        mask = self.corners(0, nr, 0, nc)
+        # vertexes are numbered row by row, cell by cell, corner by corner
+        index = np.full(mask.shape, -1, dtype=np.int64)
+        index[mask] = np.arange(np.count_nonzero(mask))
+        co = self.coords(mask, 0, nr, 0, nc)
+
+        groups = []
         # bottom row
-        row = 0
-        for col in range(1, len(cells[row]) - 1):
-            s = cells[row][col]
-            l = cells[row][col - 1]
-            u = cells[row + 1][col]
-            
-            faces.append((s[1], u[5], u[4], s[2]))
-            faces.append((s[2], u[4], l[0]))
+        cols = np.arange(1, nc - 1)
+        groups.append(self.faces(index, np.zeros_like(cols), cols, self.FACES_BELOW))
 
         # top row
-        row = len(cells) - 1
-        cs = 0
-        if row % 2: cs += 1
-        for col in range(1 + cs, len(cells[row]) - 1):
-            s = cells[row][col]
-            l = cells[row][col - 1]
-            d = cells[row - 1][col - cs]
-            faces.append((s[3], l[5], d[1]))
-            faces.append([s[3], d[1], d[0], s[4]])
-            
+        row = nr - 1
+        cols = np.arange(1 + row % 2, nc - 1)
+        groups.append(self.faces(index, np.full_like(cols, row), cols, self.FACES_ABOVE))
+
         # middle rows
-        for row in range(1, len(cells) - 1):
-            cs = 0
-            if row % 2: cs += 1
-            for col in range(1, len(cells[row]) - 1):
-                s = cells[row][col]
-                l = cells[row][col - 1]
-                u = cells[row + 1][col - cs]
-                d = cells[row - 1][col - cs]
-                
-                faces.append((s[1], u[5], u[4], s[2]))
-                faces.append((s[2], u[4], l[0]))
-                faces.append([s[2], l[0], l[5], s[3]])
-                faces.append((s[3], l[5], d[1]))
-                faces.append([s[3], d[1], d[0], s[4]])
-        
-        # right column
-        row = 0
-        col = len(cells[row]) - 1
-        for row in range(1, len(cells) - 1):
-            cs = 0
-            if row % 2: cs += 1
-            
-            s = cells[row][col]
-            l = cells[row][col - 1]
-            u = cells[row + 1][col - cs]
-            d = cells[row - 1][col - cs]
-            
-            if row % 2 and row < len(cells) - 2:
-                faces.append((s[1], u[5], u[4], s[2]))
-            faces.append((s[2], u[4], l[0]))
-            faces.append([s[2], l[0], l[5], s[3]])
-            faces.append((s[3], l[5], d[1]))
-            if row % 2 and row > 1:
-                faces.append([s[3], d[1], d[0], s[4]])
-                
+        rows, cols = np.mgrid[1:nr - 1, 1:nc - 1]
+        groups.append(self.faces(index, rows, cols, self.FACES_ALL))
+
+        # right column, the odd rows close the cells above and below
+        rows = np.arange(1, nr - 1)
+        cols = np.full_like(rows, nc - 1)
+        groups.append(self.faces(index, rows, cols, self.FACES_ALL, self.face_mask(rows, cols)))
+
         # final fix
         if not self.rows % 2:
-            row = len(cells) - 1
-            s = cells[row][col]
-            l = cells[row][col - 1]
-            d = cells[row - 1][col - 1]
-            faces.append((s[3], l[5], d[1]))
-            faces.append([s[3], d[1], d[0], s[4]])
-        
+            groups.append(self.faces(index, [nr - 1], [nc - 1], self.FACES_ABOVE))
+
+        loops = np.concatenate([loops for loops, sizes in groups])
+        sizes = np.concatenate([sizes for loops, sizes in groups])
+        return co, loops, sizes
+
+    def generate(self):
+        co, loops, sizes = self.arrays()
+        verts = [tuple(v) for v in co.tolist()]
+        faces = [tuple(f) for f in np.split(loops, np.cumsum(sizes)[:-1])] if len(sizes) else []
         return verts, faces
 
+    def bands(self, cells):
+        """
+        Full width bands of grid rows of about cells cells each
+        """
+        nr, nc = self.grid()
+        step = max(1, cells // nc)
+        return [(r0, min(r0 + step, nr)) for r0 in range(0, nr, step)]
+
+    def streamed(self, cells):
+        """
+        The mesh of arrays() built band by band into float32/int32 buffers,
+        so only the buffers scale with the panel. Vertexes are the same, the
+        faces come cell by cell instead of in arrays() order.
+        :param cells: about how many cells to generate at a time
+        :return: co, loops, sizes
+        """
+        nr, nc = self.grid()
+        sizes_all = np.array([len(face) for face in self.FACES_ALL])
+        starts = [0]
+        nf = nl = 0
+        for r0, r1 in self.bands(cells):
+            starts.append(starts[-1] + np.count_nonzero(self.corners(r0, r1, 0, nc)))
+            rows, cols = np.mgrid[r0:r1, 0:nc]
+            include = self.face_mask(rows, cols)
+            nf += np.count_nonzero(include)
+            nl += int((include * sizes_all).sum())
+        co = np.empty((starts[-1], 3), dtype=np.float32)
+        loops = np.empty(nl, dtype=np.int32)
+        sizes = np.empty(nf, dtype=np.int32)
+
+        f = l = 0
+        for b, (r0, r1) in enumerate(self.bands(cells)):
+            # the band with the rows above and below its faces reach
+            a = max(r0 - 1, 0)
+            z = min(r1 + 1, nr)
+            mask = self.corners(a, z, 0, nc)
+            first = starts[b] - np.count_nonzero(mask[:r0 - a])
+            index = np.full(mask.shape, -1, dtype=np.int64)
+            index[mask] = first + np.arange(np.count_nonzero(mask))
+            co[starts[b]:starts[b + 1]] = self.coords(mask[r0 - a:r1 - a], r0, r1, 0, nc)
+
+            rows, cols = np.mgrid[r0:r1, 0:nc]
+            band_loops, band_sizes = self.faces(index, rows, cols, self.FACES_ALL,
+                                                self.face_mask(rows, cols), origin=(a, 0))
+            loops[l:l + len(band_loops)] = band_loops
+            sizes[f:f + len(band_sizes)] = band_sizes
+            l += len(band_loops)
+            f += len(band_sizes)
+        return co, loops, sizes
+
+    def tiles(self, size):
+        """
+        :return: (r0, r1, c0, c1) grid tiles of size x size cells
+        """
+        nr, nc = self.grid()
+        return [(r0, min(r0 + size, nr), c0, min(c0 + size, nc))
+                for r0 in range(0, nr, size) for c0 in range(0, nc, size)]
+
+    def tile_origin(self, r0, c0):
+        return (self.sx + self.dx * (c0 - 1), self.sy + self.dy * (r0 - 1), 0.0)
+
+    def tile_key(self, r0, r1, c0, c1):
+        """
+        Tiles away from the border with the same key have the same mesh
+        around their origin, None for the others
+        """
+        nr, nc = self.grid()
+        if r0 < 1 or r1 > nr - 1 or c0 < 1 or c1 > nc - 1:
+            return None
+        return (r1 - r0, c1 - c0, r0 % 2)
+
+    def tile_arrays(self, r0, r1, c0, c1):
+        """
+        Mesh of the faces the tile cells own, with their own copy of the
+        seam vertexes of the neighbour tiles, around tile_origin()
+        :return: co, loops, sizes
+        """
+        nr, nc = self.grid()
+        a, z = max(r0 - 1, 0), min(r1 + 1, nr)
+        left, right = max(c0 - 1, 0), min(c1 + 1, nc)
+        mask = self.corners(a, z, left, right)
+        index = np.full(mask.shape, -1, dtype=np.int64)
+        index[mask] = np.arange(np.count_nonzero(mask))
+
+        rows, cols = np.mgrid[r0:r1, c0:c1]
+        loops, sizes = self.faces(index, rows, cols, self.FACES_ALL,
+                                  self.face_mask(rows, cols), origin=(a, left))
+        used = np.unique(loops)
+        co = self.coords(mask, a, z, left, right)[used] - self.tile_origin(r0, c0)
+        return co, np.searchsorted(used, loops), sizes
+
+    def to_mesh(self, mesh, tile=None):
+        """
+        Writes the honeycomb into an empty mesh without from_pydata
+        :param tile: panels of more than tile x tile cells are streamed
+        """
+        if tile and self.rows * self.cols > tile * tile:
+            co, loops, sizes = self.streamed(tile * tile)
+        else:
+            co, loops, sizes = self.arrays()
+        return write_mesh(mesh, co, loops, sizes)
+
+
+def write_mesh(mesh, co, loops, sizes):
+    starts = np.zeros(len(sizes), dtype=np.int32)
+    np.cumsum(sizes[:-1], out=starts[1:])
+
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set('co', np.asarray(co, dtype=np.float32).ravel())
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set('vertex_index', np.asarray(loops, dtype=np.int32))
+    mesh.polygons.add(len(sizes))
+    mesh.polygons.foreach_set('loop_start', starts)
+    mesh.polygons.foreach_set('loop_total', np.asarray(sizes, dtype=np.int32))
+    mesh.update(calc_edges=True)
+    return mesh
+
 
 def edge_max(diam):
     return diam * sin(pi / 3)
@@ -184,12 +378,12 @@ class add_mesh_honeycomb(bpy.types.Operator):
     
     rows : IntProperty(
         name = 'Num of rows', default = 2,
-        min = 1, max = 100,
+        min = 1, max = 10000, soft_max = 100,
         description='Number of the rows')
     
     cols : IntProperty(
         name = 'Num of cols', default = 2,
-        min = 1, max = 100,
+        min = 1, max = 10000, soft_max = 100,
         description='Number of the columns')
     
     def fix_edge(self, context):
@@ -206,6 +400,18 @@ class add_mesh_honeycomb(bpy.types.Operator):
         min = 0.0, update = fix_edge,
         description='Width of the edge')
     
+    tile : IntProperty(
+        name = 'Tile Size', default = 64,
+        min = 4, max = 1024,
+        description='Cells per tile side, large panels are generated tile by tile')
+    
+    split : EnumProperty(
+        name = 'Output', default = 'MESH',
+        items = [('MESH', 'Single Mesh', 'One mesh, generated tile by tile'),
+                 ('OBJECTS', 'Tile Objects', 'One object per tile'),
+                 ('INSTANCES', 'Tile Instances', 'One object per tile, the inner tiles share one mesh')],
+        description='How to output the panel')
+    
     # generic transform props
     view_align : BoolProperty(
         name="Align to View",
@@ -224,15 +430,32 @@ class add_mesh_honeycomb(bpy.types.Operator):
     
     ##### EXECUTE #####
     def execute(self, context):
-        mesh = bpy.data.meshes.new(name='honeycomb')
-        
         comb = honeycomb_geometry(self.rows, self.cols, self.diam, self.edge)
-        verts, faces = comb.generate()
         
-        mesh.from_pydata(vertices = verts, edges = [], faces = faces)
-        mesh.update()
+        if self.split == 'MESH':
+            mesh = bpy.data.meshes.new(name='honeycomb')
+            comb.to_mesh(mesh, self.tile)
+            object_utils.object_data_add(context, mesh, operator=self)
+            return {'FINISHED'}
         
-        object_utils.object_data_add(context, mesh, operator=self)
+        # tiles are parented to an empty placed like the single mesh would be
+        parent = object_utils.object_data_add(context, None, operator=self, name='honeycomb')
+        collection = parent.users_collection[0]
+        shared = {}
+        for r0, r1, c0, c1 in comb.tiles(self.tile):
+            key = comb.tile_key(r0, r1, c0, c1) if self.split == 'INSTANCES' else None
+            mesh = shared.get(key)
+            if mesh is None:
+                co, loops, sizes = comb.tile_arrays(r0, r1, c0, c1)
+                if not len(sizes):
+                    continue
+                mesh = write_mesh(bpy.data.meshes.new(name='honeycomb_tile'), co, loops, sizes)
+                if key is not None:
+                    shared[key] = mesh
+            obj = bpy.data.objects.new('honeycomb_%d_%d' % (r0 // self.tile, c0 // self.tile), mesh)
+            obj.location = comb.tile_origin(r0, c0)
+            obj.parent = parent
+            collection.objects.link(obj)
         
         return {'FINISHED'}
 
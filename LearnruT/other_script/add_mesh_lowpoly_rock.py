@@ -1,7 +1,11 @@
 
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import bpy
 import bmesh
+import numpy as np
 from mathutils import Matrix
 from math import radians
 from random import seed, uniform
@@ -10,18 +14,110 @@ ROCK_NAME = "LowPolyRock"
 ORIGIN_NAME = ROCK_NAME + "DisplaceOrigin"
 TEXTURE_NAME = ROCK_NAME + "Texture"
 ANGLE_MAX = radians(90)
-
+# vertexes per voronoi() step: each thread holds about CHUNK * 27 * 3
+# float64 temporaries (5 MB), for at most FAST_WORKERS threads
+CHUNK = 1 << 13
+FAST_WORKERS = min(8, os.cpu_count() or 1)
+
+# unit icospheres by subdivision, (verts, triangles) arrays
+BASE_MESHES = {}
+
+
+def get_basesphere(subdiv):
+    """
+    Unit icosphere of subdiv, built once with bmesh and shared by every rock
+    """
+    base = BASE_MESHES.get(subdiv)
+    if base is None:
+        bm = bmesh.new()
+        bmesh.ops.create_icosphere(bm, subdivisions=subdiv, diameter=1.0, matrix=Matrix())
+        verts = np.array([v.co[:] for v in bm.verts], dtype=np.float64)
+        faces = np.array([[v.index for v in f.verts] for f in bm.faces], dtype=np.int32)
+        bm.free()
+        base = BASE_MESHES[subdiv] = (verts, faces)
+    return base
+
+def mesh_from_arrays(me, verts, faces):
+    me.vertices.add(len(verts))
+    me.vertices.foreach_set('co', verts.astype(np.float32).ravel())
+    me.loops.add(faces.size)
+    me.loops.foreach_set('vertex_index', faces.ravel())
+    me.polygons.add(len(faces))
+    me.polygons.foreach_set('loop_start', np.arange(0, faces.size, 3, dtype=np.int32))
+    me.polygons.foreach_set('loop_total', np.full(len(faces), 3, dtype=np.int32))
+    me.update(calc_edges=True)
+    return me
 
 def get_basemesh(context, subdiv=5, radius=1.0, ratio=(1., 1., 1.)):
+    verts, faces = get_basesphere(subdiv)
     me = context.blend_data.meshes.new('tempmeshname')
-    bm = bmesh.new()
-    bm.from_mesh(me)
-    mat = Matrix()
-    mat[0][0], mat[1][1], mat[2][2] = ratio
-    bmesh.ops.create_icosphere(
-        bm, subdivisions=subdiv, diameter=radius, matrix=mat)
-    bm.to_mesh(me)
-    return me
+    return mesh_from_arrays(me, verts * radius * np.asarray(ratio), faces)
+
+def _cell_points(cells):
+    """
+    One pseudo random feature point per integer cell, hashed from its coords
+    """
+    h = cells.astype(np.uint32) * np.array([73856093, 19349663, 83492791], dtype=np.uint32)
+    h = h[..., 0] ^ h[..., 1] ^ h[..., 2]
+    points = np.empty(cells.shape, dtype=np.float64)
+    for i in range(3):
+        h = (h ^ (h >> np.uint32(16))) * np.uint32(0x45d9f3b)
+        h = (h ^ (h >> np.uint32(16))) * np.uint32(0x45d9f3b)
+        h = h ^ (h >> np.uint32(16))
+        points[..., i] = h / 4294967296.0
+    return cells + points
+
+OFFSETS = np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1], indexing='ij'), -1).reshape(-1, 3)
+
+def voronoi(co, weights):
+    """
+    Weighted distances to the 3 nearest feature points, like the VORONOI
+    texture: |w1 * F1 + w2 * F2 + w3 * F3|
+    """
+    out = np.empty(len(co))
+    for start in range(0, len(co), CHUNK):
+        p = co[start:start + CHUNK]
+        cells = np.floor(p).astype(np.int64)[:, None, :] + OFFSETS
+        dist = np.linalg.norm(p[:, None, :] - _cell_points(cells), axis=2)
+        nearest = np.sort(np.partition(dist, 2, axis=1)[:, :3], axis=1)
+        out[start:start + CHUNK] = np.abs(nearest @ np.asarray(weights, dtype=np.float64))
+    return out
+
+def texture_value(co, size=1.0, brightness=.8, contrast=.8, weights=(1.0, .3, .0)):
+    """
+    Intensity of the get_texture() texture at co: voronoi, brightness and
+    contrast, then the black (.5) to white (1.0) ramp, smoothed like its
+    B-spline interpolation
+    """
+    value = voronoi(co / max(size, 1e-4), weights)
+    value = (value - .5) * contrast + brightness - .5
+    ramp = np.clip((value - .5) / .5, .0, 1.0)
+    return ramp * ramp * (3.0 - 2.0 * ramp)
+
+def rock_shape(subdiv, radius, size_ratio):
+    """
+    Vertexes and normals of the base sphere scaled to one rock
+    """
+    unit, faces = get_basesphere(subdiv)
+    scale = np.maximum(radius * np.asarray(size_ratio, dtype=np.float64), 1e-6)
+    verts = unit * scale
+    normals = unit / scale
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    return verts, normals
+
+def displace_rock(subdiv, radius, size_ratio, noise_center, noise_size,
+                  noise_brightness, sharpness, displace_midlevel,
+                  displace_strength, voronoi_weights):
+    """
+    Fast Noise worker: vertexes of one rock pushed along its normals by
+    texture_value(). That is not Blender's voronoi noise, the rocks differ
+    from the displace modifier ones.
+    """
+    verts, normals = rock_shape(subdiv, radius, size_ratio)
+    value = texture_value(
+        verts - np.asarray(noise_center) * radius, size=radius * noise_size,
+        brightness=noise_brightness, contrast=sharpness, weights=voronoi_weights)
+    return verts + normals * ((value - displace_midlevel) * radius * displace_strength)[:, None]
 
 def get_texture(context, name, size=1.0, brightness=.8, contrast=.8,
                 weights=(1.0, .3, .0)):
@@ -41,7 +137,12 @@ def get_texture(context, name, size=1.0, brightness=.8, contrast=.8,
 def create_rock(context, subdiv, radius, size_ratio,
                 noise_center, noise_size, noise_brightness,
                 sharpness, displace_midlevel, displace_strength,
-                voronoi_weights, simplicity, collapse_ratio):
+                voronoi_weights, simplicity, collapse_ratio, texture=None):
+    """
+    :param texture: get_texture() texture of noise_size shared by the rocks,
+        the origin's scale of radius sizes the noise to the rock instead.
+        None for a texture of the rock's own.
+    """
     me = get_basemesh(context, subdiv, radius, size_ratio)
     rock = context.blend_data.objects.new(ROCK_NAME, me)
     rock.show_all_edges = True
@@ -65,11 +166,20 @@ def create_rock(context, subdiv, radius, size_ratio,
     disp.strength = radius * displace_strength
     disp.texture_coords = 'OBJECT'
     disp.texture_coords_object  = noise_origin
-    disp.texture = get_texture(
-        context, TEXTURE_NAME + number, size=radius * noise_size,
-        brightness=noise_brightness,
-        contrast=sharpness, weights=voronoi_weights)
+    if texture is None:
+        disp.texture = get_texture(
+            context, TEXTURE_NAME + number, size=radius * noise_size,
+            brightness=noise_brightness,
+            contrast=sharpness, weights=voronoi_weights)
+    else:
+        # a zero scale has no inverse for the texture coordinates
+        noise_origin.scale = (max(radius, 1e-4),) * 3
+        disp.texture = texture
 
+    add_decimate(rock, simplicity, collapse_ratio)
+    return rock, noise_origin
+
+def add_decimate(rock, simplicity, collapse_ratio):
     # Collapse
     collapse = rock.modifiers.new('collapse', 'DECIMATE')
     collapse.decimate_type = 'COLLAPSE'
@@ -81,7 +191,48 @@ def create_rock(context, subdiv, radius, size_ratio,
     planer.angle_limit = simplicity * ANGLE_MAX
     planer.use_dissolve_boundaries = True
 
-    return rock, noise_origin
+def create_displaced_rock(context, verts, faces, simplicity, collapse_ratio):
+    """
+    Rock from already displaced vertexes, only the decimate modifiers left
+    """
+    me = mesh_from_arrays(context.blend_data.meshes.new(ROCK_NAME), verts, faces)
+    rock = context.blend_data.objects.new(ROCK_NAME, me)
+    rock.show_all_edges = True
+    context.scene.collection.objects.link(rock)
+    add_decimate(rock, simplicity, collapse_ratio)
+    return rock
+
+def apply_modifiers(context, rock):
+    """
+    Replaces the rock's mesh by its evaluated one, modifiers applied
+    """
+    me_orig = rock.data
+    rock.data = rock.to_mesh(context.depsgraph,True,calc_undeformed=True)
+    context.blend_data.meshes.remove(me_orig)
+    rock.modifiers.clear()
+
+def rock_settings(op, cursor):
+    """
+    Size, ratio, noise center and location of every rock, drawn from the
+    random generator in the order the serial loop used to
+    """
+    radius = op.size
+    size_ratio = op.size_ratio.copy()
+    noise_center = op.noise_center.copy()
+    location = cursor.copy()
+    settings = []
+    for n in range(op.num_rock):
+        settings.append((radius, size_ratio.copy(), noise_center.copy(), location.copy()))
+        radius = op.size * (1.0 + uniform(op.size_min, op.size_max))
+        for i in range(3):
+            noise_center[i] = op.noise_center[i] + uniform(-1000, 1000)
+            size_ratio[i] = op.size_ratio[i] * \
+                (1.0 + uniform(op.size_ratio_min[i], op.size_ratio_max[i]))
+        if n % 2 == 0:
+            location.x = cursor.x + op.size * 1.6 * (n // 2 + 1)
+        else:
+            location.x = cursor.x - op.size * 1.6 * (n // 2 + 1)
+    return settings
 
 
 class LowPolyRock(bpy.types.Operator):
@@ -91,7 +242,7 @@ class LowPolyRock(bpy.types.Operator):
     bl_options = {'REGISTER', 'UNDO', 'PRESET'}
 
     num_rock : bpy.props.IntProperty(
-        name="Number", min=1, max=9, default=1,
+        name="Number", min=1, max=1000, soft_max=100, default=1,
         description="Number of rocks")
     size : bpy.props.FloatProperty(
         name="Size", min=.0, default=1.0, precision=3, step=0.01)
@@ -126,6 +277,11 @@ class LowPolyRock(bpy.types.Operator):
         name="Ratio Max", size=3, min=.0, default=(.2, .2, .2),
         precision=3, step=0.01)
 
+    fast_noise : bpy.props.BoolProperty(
+        name="Fast Noise", default=False,
+        description="Displace with a NumPy voronoi noise in worker threads "
+                    "instead of Blender's voronoi texture: the same seed gives "
+                    "other rocks than without it or with Keep Modifiers")
     keep_modifiers : bpy.props.BoolProperty(
         name="Keep Modifiers", default=False,
         description="Keep modifiers")
@@ -195,6 +351,8 @@ class LowPolyRock(bpy.types.Operator):
         advanced.prop(self, 'advanced_menu', text="Advanced Settings:")
         if self.advanced_menu:
             advanced.prop(self, 'keep_modifiers')
+            if not self.keep_modifiers:
+                advanced.prop(self, 'fast_noise')
             advanced.prop(self, 'displace_strength')
             advanced.prop(self, 'voronoi_weights')
             advanced.prop(self, 'noise_size')
@@ -205,64 +363,74 @@ class LowPolyRock(bpy.types.Operator):
     def execute(self, context):
         bpy.ops.object.select_all(action='DESELECT')
 
-        radius = self.size
-        size_ratio = self.size_ratio.copy()
-        noise_center = self.noise_center.copy()
-
         random_seed = self.random_seed
         if random_seed == -1:
             random_seed = None
         seed(random_seed)
 
-        location = context.scene.cursor.location.copy()
-        rocks = [None] * self.num_rock
-        for n in range(self.num_rock):
-            rock, noise_origin = create_rock(
-                context, self.subdiv, radius, size_ratio,
-                noise_center, self.noise_size, self.noise_brightness,
-                self.sharpness, self.displace_midlevel, self.displace_strength,
-                self.voronoi_weights, self.simplicity, self.collapse_ratio)
-            rocks[n] = rock
-
-            if self.keep_modifiers:
+        settings = rock_settings(self, context.scene.cursor.location)
+        if self.keep_modifiers:
+            rocks = []
+            for radius, size_ratio, noise_center, location in settings:
+                rock, noise_origin = create_rock(
+                    context, self.subdiv, radius, size_ratio,
+                    noise_center, self.noise_size, self.noise_brightness,
+                    self.sharpness, self.displace_midlevel, self.displace_strength,
+                    self.voronoi_weights, self.simplicity, self.collapse_ratio)
                 rock.location = location
                 noise_origin.location += location
-            else:
-                context.scene.update()
-                me_orig = rock.data
-                tex = rock.modifiers['displace'].texture
-                rock.data = rock.to_mesh(context.depsgraph,True,calc_undeformed=True)
-                context.blend_data.meshes.remove(me_orig)
-                rock.modifiers.clear()
-                rock.location = location
-                context.scene.collection.objects.unlink(noise_origin)
-                context.blend_data.objects.remove(noise_origin)
-                context.blend_data.textures.remove(tex)
+                rocks.append(rock)
+        elif self.fast_noise:
+            # displacement in worker threads (NumPy releases the GIL),
+            # meshes created here as the results come in. Workers get
+            # plain values, never the operator properties.
+            faces = get_basesphere(self.subdiv)[1]
+            jobs = [(self.subdiv, radius, tuple(size_ratio), tuple(noise_center),
+                     self.noise_size, self.noise_brightness, self.sharpness,
+                     self.displace_midlevel, self.displace_strength, tuple(self.voronoi_weights))
+                    for radius, size_ratio, noise_center, location in settings]
+            with ThreadPoolExecutor(max_workers=FAST_WORKERS) as pool:
+                rocks = [create_displaced_rock(context, verts, faces, self.simplicity, self.collapse_ratio)
+                         for verts in pool.map(lambda job: displace_rock(*job), jobs)]
+            # one depsgraph update decimates every rock, in parallel
+            context.scene.update()
+            for rock, setting in zip(rocks, settings):
+                apply_modifiers(context, rock)
+                rock.location = setting[3]
+        else:
+            # the rocks share one texture, each origin's scale sizes it
+            tex = get_texture(context, TEXTURE_NAME, size=self.noise_size,
+                              brightness=self.noise_brightness,
+                              contrast=self.sharpness, weights=self.voronoi_weights)
+            rocks = []
+            origins = []
+            for radius, size_ratio, noise_center, location in settings:
+                rock, noise_origin = create_rock(
+                    context, self.subdiv, radius, size_ratio,
+                    noise_center, self.noise_size, self.noise_brightness,
+                    self.sharpness, self.displace_midlevel, self.displace_strength,
+                    self.voronoi_weights, self.simplicity, self.collapse_ratio, texture=tex)
+                rocks.append(rock)
+                origins.append(noise_origin)
+            # one depsgraph update displaces and decimates every rock, in
+            # parallel, instead of one update per rock
+            context.scene.update()
+            for rock, noise_origin, setting in zip(rocks, origins, settings):
+                apply_modifiers(context, rock)
+                rock.location = setting[3]
+                context.blend_data.objects.remove(noise_origin, do_unlink=True)
+            context.blend_data.textures.remove(tex)
 
+        for rock in rocks:
             if self.edge_split:
-                rock.select_set(True)
-                bpy.ops.object.shade_smooth()
+                # shade_smooth without selecting every rock for the operator
+                rock.data.polygons.foreach_set(
+                    'use_smooth', np.ones(len(rock.data.polygons), dtype=bool))
                 split = rock.modifiers.new('split', 'EDGE_SPLIT')
                 split.use_edge_angle = True
                 split.use_edge_sharp = False
                 split.split_angle = .0
-                rock.select_set(False)
-
             rock.data.name = rock.name
-
-            radius = self.size * (1.0 + uniform(self.size_min, self.size_max))
-            for i in range(3):
-                noise_center[i] = self.noise_center[i] + uniform(-1000, 1000)
-                size_ratio[i] = self.size_ratio[i] * \
-                    (1.0 + uniform(self.size_ratio_min[i], self.size_ratio_max[i]))
-            if n % 2 == 0:
-                location.x = context.scene.cursor.location.x \
-                    + self.size * 1.6 * (n // 2 + 1)
-            else:
-                location.x = context.scene.cursor.location.x \
-                    - self.size * 1.6 * (n // 2 + 1)
-
-        for rock in rocks:
             rock.select_set(True)
 
         return {'FINISHED'}
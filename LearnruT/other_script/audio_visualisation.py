@@ -1,48 +1,30 @@
 
 import bpy
 import math
+import os
+import sys
 
+import numpy as np
 
+# Blender runs this file as a script or single-file add-on, not as a package,
+# so its directory isn't on sys.path and the sibling gx_* modules can't be
+# imported without it
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import gx_spectrum
+from gx_profile import profiler
 
-base = math.pow(2, (1. / 3))
-
-def compute(xarg):
-    """
-    Computes value of tercja function ignoring set bounds
-    :param xarg: x argument for func
-    :return: computed y value
-    """
-    return base ** xarg
-
-def compute_inverse(yarg):
-    """
-    Computes inverse of tercja
-    :param yarg: y argument for func
-    :return: corresponding x value
-    """
-    # non positive numbers are out of domain of log func
-    #we are silently ignoring it
-    if yarg <= 0:
-        return 0
-    return math.log(yarg, base)
-
-
-def get_value_from_x(xx, minimum_x, maximum_x):
-    """
-    Computes value from percentage in interval. For more details please see:
-    https://github.com/Xevaquor/GXAudioVisualisation/wiki/Tercja
-    Eg: .42 means 42%
-    :param xx: Percent in interval. Must be in range [0,1]
-    :param minimum_x: Lower x bound
-    :param maximum_x: Upper x bound
-    :return: corresponding value of Tercja func
-    """
-    assert (0 <= xx <= 1)
-    return compute(xx * (maximum_x - minimum_x) + minimum_x)
 
 #\__author__ = "Xevaquor"
 
+class GxBar(bpy.types.PropertyGroup):
+    """One slot of the bar registry, the slot index is the bar index"""
+    bar: bpy.props.PointerProperty(type=bpy.types.Object)
+    helper: bpy.props.PointerProperty(type=bpy.types.Object)
+
 def initprop():
+    bpy.types.Scene.gx_bars_l = bpy.props.CollectionProperty(type=GxBar)
+    bpy.types.Scene.gx_bars_r = bpy.props.CollectionProperty(type=GxBar)
+
     bpy.types.Scene.gx_slash_rotate = bpy.props.BoolProperty(
         name = "Rotation",
         description = "Slash Rotation",
@@ -70,6 +52,41 @@ def initprop():
         name = "Square",
         description = "Square")
 
+    bpy.types.Scene.gx_use_cache = bpy.props.BoolProperty(
+        name = "Spectrum Cache",
+        default = True,
+        description = "Keep analysed spectrograms on disk so re-bakes skip decoding")
+
+    bpy.types.Scene.gx_direct = bpy.props.BoolProperty(
+        name = "Direct Bake",
+        default = False,
+        description = "Key the bars themselves instead of driving them from helper empties")
+
+    bpy.types.Scene.gx_preview = bpy.props.BoolProperty(
+        name = "Live Preview",
+        default = False,
+        description = "Move the bars with the sound at the playhead, without baking",
+        update=update_preview)
+
+    bpy.types.Scene.gx_profile = bpy.props.BoolProperty(
+        name = "Profile",
+        default = False,
+        description = "Time bake phases and update callbacks",
+        update=update_profile)
+
+    bpy.types.Scene.gx_decimate = bpy.props.BoolProperty(
+        name = "Decimate",
+        default = False,
+        description = "Drop keyframes that linear interpolation can rebuild within the tolerance")
+
+    bpy.types.Scene.gx_tolerance = bpy.props.FloatProperty(
+        name = "Tolerance",
+        default = 0.005,
+        min = 0,
+        step = 0.1,
+        precision = 4,
+        description = "Largest error the decimated curves may have")
+
     bpy.types.Scene.gx_sthreshold = bpy.props.FloatProperty(
         name = "Sthreshold",
         default = 0.1)
@@ -127,7 +144,8 @@ def initprop():
     bpy.types.Scene.gx_type = bpy.props.EnumProperty(
         items = [('0', 'Array', 'array'),
                  ('1', 'Object scaling', 'object'),
-                 ('2', 'Center object scaling', 'center_object')],
+                 ('2', 'Center object scaling', 'center_object'),
+                 ('3', 'Single mesh', 'All bars in one mesh, heights as shape keys')],
         name = "Visualisation Type",
         update=update_channels)
 
@@ -289,10 +307,35 @@ def initpropvalues():
     bpy.context.scene['gx_additive'] = False
     bpy.context.scene['gx_square'] = False
     bpy.context.scene['gx_sthreshold'] = 0.1
+    bpy.context.scene['gx_use_cache'] = True
+    bpy.context.scene['gx_direct'] = False
+    bpy.context.scene['gx_decimate'] = False
+    bpy.context.scene['gx_preview'] = False
+    bpy.context.scene['gx_profile'] = False
+    bpy.context.scene['gx_tolerance'] = 0.005
 
     bpy.context.scene['gx_init'] = 1
 
 calc = 1
+bake_workers = None
+spectrum_cache = None
+
+BAR_MESH = "gx_bars"
+BAR_ACTION = BAR_MESH + "KeyAction"
+# unit cube standing on z=0, corner index = z*4 + y*2 + x
+CUBE_CORNERS = np.array([(x, y, z) for z in (0, 1) for y in (-1, 1) for x in (-1, 1)], dtype=np.float32)
+CUBE_FACES = np.array([(0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4),
+                       (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5)])
+# sizeof(BezTriple), what one keyframe costs in memory and in the .blend
+BEZT_BYTES = 72
+# height of the flattened cube generate_objects makes for 'Object scaling'
+BAR_HEIGHT = 0.12
+
+def get_spectrum_cache():
+    global spectrum_cache
+    if spectrum_cache is None:
+        spectrum_cache = gx_spectrum.SpectrumCache()
+    return spectrum_cache
 
 class GXAVPanel(bpy.types.Panel):
     """Creates a Panel in the scene context of the properties editor"""
@@ -401,6 +444,8 @@ class GXAVPanel(bpy.types.Panel):
                 col = split.column(align=True)
                 col.prop(scene, 'gx_threshold')
                 col.prop(scene, 'gx_sthreshold')
+                row = box.row()
+                row.prop(scene, 'gx_preview', icon="PLAY")
                 split = box.split()
                 col = split.column()
 
@@ -409,13 +454,91 @@ class GXAVPanel(bpy.types.Panel):
                 col.prop(scene, 'gx_additive')
                 col = split.column()
                 col.prop(scene, 'gx_square')
+                row = box.row()
+                row.prop(scene, 'gx_use_cache')
+                row.prop(scene, 'gx_direct')
+                row = box.row()
+                row.prop(scene, 'gx_decimate')
+                row.prop(scene, 'gx_tolerance')
+                if scene.get('gx_keys_baked'):
+                    box.label(text="%d of %d keyframes, ~%.1f MB" % (
+                        scene['gx_keys_kept'], scene['gx_keys_baked'],
+                        scene['gx_keys_kept'] * BEZT_BYTES / 1048576.0))
                 #row = layout.row()
                 #row.prop(scene, 'gx_zenit')
+                box = layout.box()
+                row = box.row()
+                row.prop(scene, 'gx_profile')
+                if scene.gx_profile:
+                    row.operator("object.gx_profile_reset", text="Reset")
+                    for name, total in profiler.summary()[:12]:
+                        box.label(text="%s: %dx %.1f ms (max %.1f) objects %d ops %d" % (
+                            name, total['calls'], total['seconds'] * 1000, total['max'] * 1000,
+                            total.get('objects', 0), total.get('ops', 0)))
+                    row = box.row()
+                    row.operator("object.gx_profile_export", text="Export JSON").format = 'JSON'
+                    row.operator("object.gx_profile_export", text="Export Chrome Trace").format = 'CHROME'
                 row = layout.row()
                 row.operator("object.gx_init_variables", icon="PROPERTIES", text="Init/Reset Variables")
         except:
             False
 
+REGISTRY = {"bar_l_": "gx_bars_l", "bar_r_": "gx_bars_r"}
+
+def registry(prefix):
+    return getattr(bpy.context.scene, REGISTRY[prefix])
+
+def bar_slot(prefix, i):
+    """
+    Registry slot i of a channel, grown as needed
+    """
+    items = registry(prefix)
+    while len(items) <= i:
+        items.add()
+    return items[i]
+
+def get_bar(prefix, i):
+    items = registry(prefix)
+    return items[i].bar if i < len(items) else None
+
+def get_helper(prefix, i):
+    items = registry(prefix)
+    return items[i].helper if i < len(items) else None
+
+def remove_object(obj):
+    if obj is not None:
+        profiler.count('objects')
+        bpy.data.objects.remove(obj, do_unlink=True)
+
+def trim_registry(prefix):
+    items = registry(prefix)
+    while len(items) and items[-1].bar is None and items[-1].helper is None:
+        items.remove(len(items) - 1)
+
+def remove_bars(prefix, first=0):
+    """
+    Removes the bars of a channel from index first on, helpers stay
+    """
+    items = registry(prefix)
+    for i in range(first, len(items)):
+        remove_object(items[i].bar)
+    trim_registry(prefix)
+
+def remove_helpers(prefix, first=0):
+    items = registry(prefix)
+    for i in range(first, len(items)):
+        remove_object(items[i].helper)
+    trim_registry(prefix)
+
+def select_last_bar():
+    count = bpy.context.scene['gx_count_x']
+    for prefix, sign in bar_sides():
+        obj = get_bar(prefix, count - 1)
+        if obj is not None:
+            bpy.context.view_layer.objects.active = obj
+            obj.select_set(True)
+
+@profiler.profiled('start')
 def gxstart():
     #print("jaa")
     try:
@@ -423,150 +546,565 @@ def gxstart():
     except:
         initpropvalues()
 
-    bpy.ops.object.select_all(action="DESELECT")
-    try:
+    for prefix in REGISTRY:
+        remove_bars(prefix)
+        # bars of files saved before the registry existed
         for i in range(bpy.context.scene['gx_count_x']):
-            name = "bar_r_" + str(i+1)
-            bpy.data.objects[name].select_set(True)
-        bpy.ops.object.delete()
-    except:
-        False
-    try:
-        for i in range(bpy.context.scene['gx_count_x']):
-            name = "bar_l_" + str(i+1)
-            bpy.data.objects[name].select_set(True)
-        bpy.ops.object.delete()
-    except:
-        False
+            remove_object(bpy.data.objects.get(prefix + str(i+1)))
+
+    if single_mesh():
+        build_bar_mesh()
+        return
+    remove_bar_mesh()
 
     for i in range(bpy.context.scene['gx_count_x']):
         generate_objects(i)
 
+    select_last_bar()
+    bpy.types.Scene.allobjects = bpy.context.scene['gx_count_x']
+    update_drivers()
+    update_layout()
+    if bpy.context.scene.get('gx_direct_baked', False):
+        restore_direct_keys()
 
+@profiler.profiled('bake.analysis')
+def bake_channels(filepaths, edges):
+    """
+    Envelopes of every band of the channel files, decoded and analysed once
+    The numeric work runs on a process pool (bake_workers, default: all
+    cores); only the returned arrays are written into Blender data.
+    :return: list of (frames, bands) arrays, None when a file can't be read
+    """
+    scene = bpy.context.scene
+    fps = scene.render.fps / scene.render.fps_base
+    cache = get_spectrum_cache() if scene.get('gx_use_cache', True) else None
+    try:
+        return gx_spectrum.bake_many([bpy.path.abspath(f) for f in filepaths], edges, fps,
+            cache = cache,
+            workers = bake_workers,
+            attack = scene['gx_attack'],
+            release = scene['gx_release'],
+            threshold = scene['gx_threshold'],
+            accumulate = scene['gx_accumulate'],
+            additive = scene['gx_additive'],
+            square = scene['gx_square'],
+            sthreshold = scene['gx_sthreshold'])
+    except Exception as e:
+        print("Bake failed: " + str(e))
+        return [None] * len(filepaths)
+
+def new_empty(name, location, reuse=True):
+    """
+    Creates (or reuses) an empty linked to the scene, without operators
+    """
+    obj = bpy.data.objects.get(name) if reuse else None
+    if obj is None:
+        obj = bpy.data.objects.new(name, None)
+        bpy.context.scene.collection.objects.link(obj)
+    obj.location = location
+    return obj
+
+def reset_action(obj):
+    """
+    The object's "<name>Action", created or emptied
+    """
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    action = bpy.data.actions.get(obj.name + "Action")
+    if action is None:
+        action = bpy.data.actions.new(obj.name + "Action")
+    else:
+        for fcu in list(action.fcurves):
+            action.fcurves.remove(fcu)
+    obj.animation_data.action = action
+    return action
+
+def keyframe_curve(action, data_path, index, values, start, group, keys=None):
+    """
+    One F-Curve filled with one keyframe_points.add and foreach_set call
+    :param keys: indices of the values to key, all of them when None
+    """
+    if keys is None:
+        keys = np.arange(len(values))
+    count = len(keys)
+    co = np.empty(count * 2, dtype=np.float32)
+    co[0::2] = keys + start
+    co[1::2] = values[keys]
+    fcu = action.fcurves.new(data_path, index=index, action_group=group)
+    fcu.keyframe_points.add(count)
+    fcu.keyframe_points.foreach_set('co', co)
+    # 1 is 'LINEAR', baked values are sampled once per frame
+    fcu.keyframe_points.foreach_set('interpolation', np.ones(count, dtype=np.int32))
+    fcu.update()
+    profiler.count('keyframes', count)
+    return fcu
+
+@profiler.profiled('bake.write_envelope')
+def write_envelope(obj, values, start, keys=None):
+    """
+    Writes baked values into the object's scale F-Curves at data level
+    """
+    profiler.count('objects')
+    action = reset_action(obj)
+    for index in range(3):
+        keyframe_curve(action, 'scale', index, values, start, "Object Transforms", keys)
+
+def direct_target():
+    """
+    (data_path, index, group) of the bar property a driver would drive
+    """
+    if bpy.context.scene['gx_type'] == 0:
+        return 'modifiers["Array"].count', 0, "Modifiers"
+    return 'scale', 2, "Object Transforms"
+
+def clear_bar_drivers(obj):
+    """
+    Removes the drivers drivering() may have left on a bar, whichever
+    gx_type they were made for, so they don't fight direct keys
+    """
+    obj.driver_remove('scale', 2)
+    if obj.modifiers.get('Array') is not None:
+        obj.modifiers['Array'].driver_remove('count')
+
+# (data_path, index) of the curves write_direct makes, for either gx_type
+DIRECT_PATHS = {('modifiers["Array"].count', 0), ('scale', 2)}
+
+@profiler.profiled('bake.write_direct')
+def write_direct(obj, values, start, keys=None):
+    """
+    Direct bake: keys the bar's Array count or Z scale with the envelope,
+    and an envelope modifier scales it by gx_driver_power, which is what
+    the drivering() driver evaluates to. A power change only edits the
+    modifier, so even a bake made at power 0 can be scaled up again.
+    """
+    profiler.count('objects')
+    data_path, index, group = direct_target()
+    if data_path != 'scale' and obj.modifiers.get('Array') is None:
+        return
+    clear_bar_drivers(obj)
+    action = reset_action(obj)
+    fcu = keyframe_curve(action, data_path, index, values, start, group, keys)
+    # maps the reference range -1..1 onto -power..power
+    env = fcu.modifiers.new('ENVELOPE')
+    env.reference_value = 0.0
+    env.default_min = -1.0
+    env.default_max = 1.0
+    env.control_points.add(start)
+    set_direct_power(fcu, bpy.context.scene['gx_driver_power'])
+    # a running preview drives the bars itself
+    fcu.mute = bool(previews)
+
+def set_direct_power(fcu, power):
+    point = fcu.modifiers[0].control_points[0]
+    point.min = -power
+    point.max = power
+
+@profiler.profiled('update.direct_power')
+def update_direct_power():
+    """
+    Sets the new gx_driver_power on the direct bake curves
+    """
+    power = bpy.context.scene['gx_driver_power']
+    data_path, index, group = direct_target()
+    for prefix in REGISTRY:
+        for item in registry(prefix):
+            obj = item.bar
+            if obj is None or obj.animation_data is None or obj.animation_data.action is None:
+                continue
+            clear_bar_drivers(obj)
+            fcu = obj.animation_data.action.fcurves.find(data_path, index=index)
+            if fcu is None or not len(fcu.modifiers) or fcu.modifiers[0].type != 'ENVELOPE':
+                continue
+            set_direct_power(fcu, power)
+
+def restore_direct_keys():
+    """
+    gxstart replaced the bars of a direct bake. Each new bar gets the keys
+    its predecessor left in "<name>Action", moved to the property the
+    current gx_type keys.
+    """
+    data_path, index, group = direct_target()
+    for prefix, sign in bar_sides():
+        for item in registry(prefix):
+            obj = item.bar
+            action = bpy.data.actions.get(obj.name + "Action") if obj is not None else None
+            if action is None:
+                continue
+            if data_path != 'scale' and obj.modifiers.get('Array') is None:
+                continue
+            fcu = action.fcurves.find(data_path, index=index)
+            if fcu is None:
+                fcu = next((f for f in action.fcurves if (f.data_path, f.array_index) in DIRECT_PATHS), None)
+                if fcu is None:
+                    continue
+                fcu.data_path = data_path
+                fcu.array_index = index
+            clear_bar_drivers(obj)
+            if obj.animation_data is None:
+                obj.animation_data_create()
+            obj.animation_data.action = action
+            if len(fcu.modifiers) and fcu.modifiers[0].type == 'ENVELOPE':
+                set_direct_power(fcu, bpy.context.scene['gx_driver_power'])
+            fcu.mute = bool(previews)
+
+def single_mesh():
+    return bpy.context.scene['gx_type'] == 3
+
+def bar_sides():
+    """
+    (name prefix, x direction) of the channels gx_channels shows
+    """
+    sides = []
     if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-        bpy.context.view_layer.objects.active = bpy.data.objects["bar_l_" + str(bpy.context.scene['gx_count_x'])]
-        bpy.ops.object.select_pattern(pattern="bar_l_" + str(bpy.context.scene['gx_count_x']))
+        sides.append(("bar_l_", -1))
     if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-        bpy.context.view_layer.objects.active = bpy.data.objects["bar_r_" + str(bpy.context.scene['gx_count_x'])]
-        bpy.ops.object.select_pattern(pattern="bar_r_" + str(bpy.context.scene['gx_count_x']))
+        sides.append(("bar_r_", 1))
+    return sides
 
-    bpy.types.Scene.allobjects = bpy.context.scene['gx_count_x']
-    update_drivers()
-    update_slash(True, True)
-    update_space_x(True, True)
+def bar_layout(count, sign):
+    """
+    (count, 3) locations and the z rotation of one channel's bars
+    """
+    scene = bpy.context.scene
+    i = np.arange(count)
+    loc = np.zeros((count, 3), dtype=np.float32)
+    loc[:, 0] = sign * (i*scene['gx_space_x'] + scene['gx_center_space']/2)
+    loc[:, 1] = scene['gx_slash'] * i
+    rot = 0.0
+    if scene['gx_slash_rotate'] == True and (scene['gx_space_x'] + scene['gx_slash']) != 0:
+        rot = sign * math.asin(scene['gx_slash']/math.sqrt(math.pow(scene['gx_space_x'],2) + math.pow(scene['gx_slash'],2)))
+    return loc, rot
+
+@profiler.profiled('build_bar_mesh')
+def build_bar_mesh():
+    """
+    'Single mesh' mode: every bar is a box of one mesh object, so creation is
+    a single from_pydata call and the depsgraph sees one object whatever the
+    count. Each bar's height is a shape key named like its bar object would
+    be, keyed by the bake and evaluated by Blender itself, so playback and
+    renders run no Python.
+    A box at rest is BAR_HEIGHT * gx_cube_scale_z high, a key at v raises it
+    by BAR_HEIGHT * gx_driver_power * v, which is the height of a driven bar
+    at an envelope of v.
+    """
+    scene = bpy.context.scene
+    count = scene['gx_count_x']
+    names = []
+    corners = []
+    for prefix, sign in bar_sides():
+        loc, rot = bar_layout(count, sign)
+        box = CUBE_CORNERS * (scene['gx_cube_scale_x'], scene['gx_cube_scale_y'], BAR_HEIGHT * scene['gx_cube_scale_z'])
+        c, s = math.cos(rot), math.sin(rot)
+        box = np.stack([box[:, 0]*c - box[:, 1]*s, box[:, 0]*s + box[:, 1]*c, box[:, 2]], axis=1)
+        corners.append(loc[:, None, :] + box[None, :, :])
+        names += [prefix + str(i+1) for i in range(count)]
+    verts = np.concatenate(corners).reshape(-1, 3) if corners else np.empty((0, 3), dtype=np.float32)
+    faces = (CUBE_FACES[None, :, :] + 8 * np.arange(len(names))[:, None, None]).reshape(-1, 4)
+
+    mesh = bpy.data.meshes.new(BAR_MESH)
+    mesh.from_pydata(verts.tolist(), [], faces.tolist())
+    mesh.update()
+    obj = bpy.data.objects.get(BAR_MESH)
+    if obj is None:
+        obj = bpy.data.objects.new(BAR_MESH, mesh)
+        scene.collection.objects.link(obj)
+    else:
+        old = obj.data
+        obj.data = mesh
+        bpy.data.meshes.remove(old)
+
+    if names:
+        obj.shape_key_add(name="Basis", from_mix=False)
+        for name in names:
+            obj.shape_key_add(name=name, from_mix=False).slider_max = 10.0
+        set_bar_rise(obj)
+        # keys are matched by name, so a rebuild keeps the baked animation
+        action = bpy.data.actions.get(BAR_ACTION)
+        if action is not None:
+            mesh.shape_keys.animation_data_create()
+            mesh.shape_keys.animation_data.action = action
+    bpy.types.Scene.allobjects = count
+    return obj
+
+def bar_keys(obj):
+    """
+    The bar shape keys of the single mesh, without its Basis
+    """
+    key = obj.data.shape_keys
+    return key.key_blocks[1:] if key is not None else []
 
-def gxbake():
-    ### calculate for tercja
-    tercja_x_min = compute_inverse(bpy.context.scene['gx_min_freq'])
-    tercja_x_max = compute_inverse(bpy.context.scene['gx_max_freq'])
-    tercja_step = (1/bpy.context.scene['gx_count_x'])
-    ###
+def set_bar_rise(obj):
+    """
+    Shapes every bar key to raise the top of its box by BAR_HEIGHT *
+    gx_driver_power, so a power change rewrites the keys, not the animation
+    """
+    mesh = obj.data
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    co = co.reshape(-1, 8, 3)
+    rise = BAR_HEIGHT * bpy.context.scene['gx_driver_power']
+    for index, kb in enumerate(bar_keys(obj)):
+        co[index, 4:, 2] += rise
+        kb.data.foreach_set('co', co.ravel())
+        co[index, 4:, 2] -= rise
+    mesh.update()
+
+def remove_bar_mesh():
+    obj = bpy.data.objects.get(BAR_MESH)
+    if obj is not None:
+        mesh = obj.data
+        bpy.data.objects.remove(obj)
+        bpy.data.meshes.remove(mesh)
+
+@profiler.profiled('bake.write_bar_values')
+def write_bar_values(curves, start):
+    """
+    Keys the shape key value of each bar of the single mesh, curves is
+    [(prefix, index, values, keys)]
+    """
+    obj = bpy.data.objects.get(BAR_MESH)
+    if obj is None or obj.data.shape_keys is None:
+        return
+    key = obj.data.shape_keys
+    if key.animation_data is None:
+        key.animation_data_create()
+    action = bpy.data.actions.get(BAR_ACTION)
+    if action is None:
+        action = bpy.data.actions.new(BAR_ACTION)
+    else:
+        for fcu in list(action.fcurves):
+            action.fcurves.remove(fcu)
+    key.animation_data.action = action
+    for prefix, index, values, keys in curves:
+        fcu = keyframe_curve(action, 'key_blocks["%s"].value' % (prefix + str(index+1)), 0,
+                             values, start, "Shape Keys", keys)
+        fcu.mute = bool(previews)
+
+# LivePreview per channel prefix while gx_preview is on
+previews = {}
+
+def mute_bar_animation(mute):
+    """
+    The preview sets the bars itself, their drivers and keys would win
+    """
+    data_path, index, group = direct_target()
+    for prefix in REGISTRY:
+        for item in registry(prefix):
+            ad = item.bar.animation_data if item.bar is not None else None
+            if ad is None:
+                continue
+            for fcu in ad.drivers:
+                fcu.mute = mute
+            if ad.action is not None:
+                fcu = ad.action.fcurves.find(data_path, index=index)
+                if fcu is not None:
+                    fcu.mute = mute
+    obj = bpy.data.objects.get(BAR_MESH)
+    key = obj.data.shape_keys if obj is not None else None
+    if key is not None and key.animation_data is not None and key.animation_data.action is not None:
+        for fcu in key.animation_data.action.fcurves:
+            fcu.mute = mute
+
+@profiler.profiled('preview.frame')
+def preview_frame(scene, depsgraph=None):
+    """
+    frame_change_post handler: bar heights from the sound at the playhead
+    """
+    if not previews:
+        return
+    fps = scene.render.fps / scene.render.fps_base
+    seconds = max(0.0, (scene.frame_current - scene['gx_start']) / fps)
+    power = scene['gx_driver_power']
+    obj = None
+    if single_mesh():
+        obj = bpy.data.objects.get(BAR_MESH)
+        if obj is None or obj.data.shape_keys is None:
+            return
+        key_blocks = obj.data.shape_keys.key_blocks
+        key_values = np.empty(len(key_blocks), dtype=np.float32)
+        key_blocks.foreach_get('value', key_values)
+        first = {prefix: 1 + n * scene['gx_count_x'] for n, (prefix, sign) in enumerate(bar_sides())}
+    for prefix, preview in previews.items():
+        values = preview.values(seconds, scene['gx_attack'], scene['gx_release'], scene['gx_threshold'],
+                                scene['gx_square'], scene['gx_sthreshold'])
+        if obj is not None:
+            if prefix in first:
+                part = key_values[first[prefix]:first[prefix] + scene['gx_count_x']]
+                n = min(len(part), len(values))
+                part[:n] = values[:n]
+            continue
+        for i, value in enumerate(values):
+            bar = get_bar(prefix, i)
+            if bar is None:
+                continue
+            if scene['gx_type'] == 0:
+                if bar.modifiers.get('Array') is not None:
+                    bar.modifiers['Array'].count = max(1, int(round(value * power)))
+            else:
+                bar.scale[2] = value * power
+    if obj is not None:
+        # foreach_set skips the RNA update, tag the key for the depsgraph
+        key_blocks.foreach_set('value', key_values)
+        obj.data.shape_keys.update_tag()
+
+def start_preview():
+    stop_preview()
+    scene = bpy.context.scene
+    edges = gx_spectrum.band_layout(scene['gx_mode'], scene['gx_count_x'], scene['gx_min_freq'], scene['gx_max_freq'])
+    files = {"bar_l_": scene['gx_left_file'], "bar_r_": scene['gx_right_file']}
+    for prefix, sign in bar_sides():
+        try:
+            previews[prefix] = gx_spectrum.LivePreview(bpy.path.abspath(files[prefix]), edges).start()
+        except Exception as e:
+            print("Preview failed for " + str(files[prefix]) + ": " + str(e))
+    if not previews:
+        return
+    mute_bar_animation(True)
+    if preview_frame not in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.append(preview_frame)
+    preview_frame(scene)
+
+def stop_preview():
+    # start_preview only mutes once a preview runs, and a scene that was
+    # never initialised has no gx_type to find the animation by
+    if previews and 'gx_init' in bpy.context.scene:
+        mute_bar_animation(False)
+    for preview in previews.values():
+        preview.stop()
+    previews.clear()
+    if preview_frame in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.remove(preview_frame)
+
+@bpy.app.handlers.persistent
+def stop_preview_on_load(*args):
+    """
+    load_pre handler: preview_frame goes with the old file, its threads have
+    to go with it
+    """
+    stop_preview()
 
+def update_preview(self, context):
+    if context.scene.gx_preview:
+        start_preview()
+    else:
+        stop_preview()
+
+@profiler.profiled('bake')
+def gxbake():
     try:
         bpy.types.Scene.bakedobjects
     except:
         bpy.types.Scene.bakedobjects = 0
 
-    bpy.ops.object.select_all(action="DESELECT")
-    try:
-        for i in range(bpy.types.Scene.bakedobjects):
-            name = "obj_r_" + str(i+1)
-            bpy.data.objects[name].select_set(True)
-        bpy.ops.object.delete()
-    except:
-        False
-    try:
-        for i in range(bpy.types.Scene.bakedobjects):
-            name = "obj_l_" + str(i+1)
-            bpy.data.objects[name].select_set(True)
-        bpy.ops.object.delete()
-    except:
-        False
+    # helper empties are reused by new_empty, only surplus ones go
+    shown = [prefix for prefix, sign in bar_sides()]
+    for prefix in REGISTRY:
+        if bpy.context.scene.get('gx_direct', False) or single_mesh() or prefix not in shown:
+            remove_helpers(prefix)
+        else:
+            remove_helpers(prefix, bpy.context.scene['gx_count_x'])
 
-    b = bpy.context.scene['gx_min_freq']
-    c = (bpy.context.scene['gx_max_freq']-bpy.context.scene['gx_min_freq'])/bpy.context.scene['gx_count_x']
+    # the same layout the filterbank of the bake is built from
+    edges = gx_spectrum.band_layout(bpy.context.scene['gx_mode'], bpy.context.scene['gx_count_x'],
+                                    bpy.context.scene['gx_min_freq'], bpy.context.scene['gx_max_freq'])
 
     bpy.context.window_manager.progress_begin(0, 100)
     bpy.context.window_manager.progress_update(0)
+
+    # every file is decoded once and all bands come out of a single STFT pass
+    left = right = None
+    if calc == 1:
+        files = []
+        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
+            files.append(bpy.context.scene['gx_left_file'])
+        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
+            files.append(bpy.context.scene['gx_right_file'])
+        baked = bake_channels(files, edges)
+        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
+            left = baked.pop(0)
+        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
+            right = baked.pop(0)
+    # without baked data keep a single rest key, like keyframe_insert_menu did
+    unbaked = np.ones(1, dtype=np.float32)
+    direct = bpy.context.scene.get('gx_direct', False)
+    single = single_mesh()
+    curves = []
+    tolerance = bpy.context.scene['gx_tolerance'] if bpy.context.scene.get('gx_decimate', False) else 0
+    # helper empties key x, y and z scale
+    per_bar = 1 if single or direct else 3
+    baked_keys = kept_keys = 0
+
     for i in range(bpy.context.scene['gx_count_x']):
-        if bpy.context.scene['gx_mode'] == 2:
-            a = b
-            b = get_value_from_x((i+1)*tercja_step, tercja_x_min, tercja_x_max)
-        elif bpy.context.scene['gx_mode'] == 1:
-            b = ((bpy.context.scene['gx_max_freq']-bpy.context.scene['gx_min_freq'])-c*(bpy.context.scene['gx_count_x']-i-1)) + bpy.context.scene['gx_min_freq']
-            a = ((bpy.context.scene['gx_max_freq']-bpy.context.scene['gx_min_freq'])-c*(bpy.context.scene['gx_count_x']-i)) + bpy.context.scene['gx_min_freq']
-        elif bpy.context.scene['gx_mode'] == 0:
-            b = ((1 - math.log(bpy.context.scene['gx_count_x']-i, bpy.context.scene['gx_count_x']+1)) * (bpy.context.scene['gx_max_freq']-bpy.context.scene['gx_min_freq'])) + bpy.context.scene['gx_min_freq']
-            a = ((1 - math.log(bpy.context.scene['gx_count_x']-i+1, bpy.context.scene['gx_count_x']+1)) * (bpy.context.scene['gx_max_freq']-bpy.context.scene['gx_min_freq'])) + bpy.context.scene['gx_min_freq']
-
-        print(str(i) + ": " + str(round(a, 1)) + " Hz - " + str(round(b, 1)) + " Hz")
+        a, b = edges[i]
+        label = str(i) + ": " + str(round(a, 1)) + " Hz - " + str(round(b, 1)) + " Hz"
+
+        print(label)
         if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            bpy.context.scene.frame_current = bpy.context.scene['gx_start']
-            bpy.ops.object.add(location=(-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, -2))
-            name = "obj_l_" + str(i+1)
-            bpy.context.active_object.name = name
-
-            bpy.ops.anim.keyframe_insert_menu(type='Scaling')
-            if calc == 1:
-                bpy.context.area.type = 'GRAPH_EDITOR'
-                try:
-                    bpy.ops.graph.sound_bake(filepath=bpy.context.scene['gx_left_file'],
-                        low=a, high=b,
-                        attack = bpy.context.scene['gx_attack'],
-                        release = bpy.context.scene['gx_release'],
-                        threshold = bpy.context.scene['gx_threshold'],
-                        use_accumulate = bpy.context.scene['gx_accumulate'],
-                        use_additive = bpy.context.scene['gx_additive'],
-                        use_square = bpy.context.scene['gx_square'],
-                        sthreshold = bpy.context.scene['gx_sthreshold'])
-                except:
-                    False
-                bpy.context.area.type = 'PROPERTIES'
+            values = left[:, i] if left is not None else unbaked
+            keys = gx_spectrum.decimate(values, tolerance)
+            baked_keys += len(values) * per_bar
+            kept_keys += len(keys) * per_bar
+            if single:
+                curves.append(("bar_l_", i, values, keys))
+            elif direct:
+                bar = get_bar("bar_l_", i)
+                if bar is not None:
+                    write_direct(bar, values, bpy.context.scene['gx_start'], keys)
+            else:
+                name = "obj_l_" + str(i+1)
+                obj = new_empty(name, (-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, -2))
+                bar_slot("bar_l_", i).helper = obj
+                write_envelope(obj, values, bpy.context.scene['gx_start'], keys)
 
             if bpy.context.scene['gx_channels'] == 0:
                 bpy.context.window_manager.progress_update((i+0.5)/bpy.context.scene['gx_count_x'])
 
             if bpy.context.scene['gx_freq_debug'] == 1:
-                bpy.ops.object.add(location=(-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, -4))
-                name = (str(i) + ": " + str(round(a, 1)) + " Hz - " + str(round(b, 1)) + " Hz")
-                bpy.context.active_object.name = name
+                name = label
+                new_empty(name, (-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, -4), reuse=False)
 
         if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            bpy.context.scene.frame_current = bpy.context.scene['gx_start']
-            bpy.ops.object.add(location=(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2, bpy.context.scene['gx_slash'] * i, -2))
-            name = "obj_r_" + str(i+1)
-            bpy.context.active_object.name = name
-
-            bpy.ops.anim.keyframe_insert_menu(type='Scaling')
-            if calc == 1:
-                bpy.context.area.type = 'GRAPH_EDITOR'
-                try:
-                    bpy.ops.graph.sound_bake(filepath=bpy.context.scene['gx_right_file'],
-                        low=a, high=b,
-                        attack = bpy.context.scene['gx_attack'],
-                        release = bpy.context.scene['gx_release'],
-                        threshold = bpy.context.scene['gx_threshold'],
-                        use_accumulate = bpy.context.scene['gx_accumulate'],
-                        use_additive = bpy.context.scene['gx_additive'],
-                        use_square = bpy.context.scene['gx_square'],
-                        sthreshold = bpy.context.scene['gx_sthreshold'])
-                except:
-                    False
-                bpy.context.area.type = 'PROPERTIES'
+            values = right[:, i] if right is not None else unbaked
+            keys = gx_spectrum.decimate(values, tolerance)
+            baked_keys += len(values) * per_bar
+            kept_keys += len(keys) * per_bar
+            if single:
+                curves.append(("bar_r_", i, values, keys))
+            elif direct:
+                bar = get_bar("bar_r_", i)
+                if bar is not None:
+                    write_direct(bar, values, bpy.context.scene['gx_start'], keys)
+            else:
+                name = "obj_r_" + str(i+1)
+                obj = new_empty(name, (i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2, bpy.context.scene['gx_slash'] * i, -2))
+                bar_slot("bar_r_", i).helper = obj
+                write_envelope(obj, values, bpy.context.scene['gx_start'], keys)
 
             if bpy.context.scene['gx_channels'] == 0:
                 bpy.context.window_manager.progress_update((i+1)/bpy.context.scene['gx_count_x'])
 
             if bpy.context.scene['gx_freq_debug'] == 1:
-                bpy.ops.object.add(location=(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2, bpy.context.scene['gx_slash'] * i, -4))
-                name = (str(i) + ": " + str(round(a, 1)) + " Hz - " + str(round(b, 1)) + " Hz")
-                bpy.context.active_object.name = name
+                name = label
+                new_empty(name, (i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2, bpy.context.scene['gx_slash'] * i, -4), reuse=False)
 
         if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 2:
             bpy.context.window_manager.progress_update((i+1)/bpy.context.scene['gx_count_x'])
 
     bpy.context.window_manager.progress_end()
-    bpy.types.Scene.bakedobjects = bpy.context.scene['gx_count_x']
+    bpy.context.scene['gx_keys_baked'] = baked_keys
+    bpy.context.scene['gx_keys_kept'] = kept_keys
+    print("%d of %d keyframes kept, %.1f MB saved" % (
+        kept_keys, baked_keys, (baked_keys - kept_keys) * BEZT_BYTES / 1048576.0))
+    if single:
+        write_bar_values(curves, bpy.context.scene['gx_start'])
+        bpy.types.Scene.bakedobjects = 0
+    elif direct:
+        # no helper empties, nothing for update_drivers to hook up
+        bpy.types.Scene.bakedobjects = 0
+    else:
+        bpy.types.Scene.bakedobjects = bpy.context.scene['gx_count_x']
+    # gxstart hands the keys of a direct bake on to rebuilt bars
+    bpy.context.scene['gx_direct_baked'] = bool(direct and not single)
 
 class GxInitVariables(bpy.types.Operator):
 
@@ -597,152 +1135,120 @@ class GxBake(bpy.types.Operator):
     def execute(self, context):
         gxbake()
         update_drivers()
+        self.report({'INFO'}, "%d of %d keyframes kept, ~%.1f MB of keyframe data" % (
+            context.scene['gx_keys_kept'], context.scene['gx_keys_baked'],
+            context.scene['gx_keys_kept'] * BEZT_BYTES / 1048576.0))
 
         return {'FINISHED'}
 
+class GxProfileExport(bpy.types.Operator):
+
+    bl_idname = "object.gx_profile_export"
+    bl_label = "Export Profile"
+
+    filepath: bpy.props.StringProperty(subtype='FILE_PATH')
+    format: bpy.props.EnumProperty(
+        items = [('JSON', 'JSON', 'Totals per phase'),
+                 ('CHROME', 'Chrome Trace', 'Every call, for chrome://tracing or Perfetto')],
+        name = "Format")
+
+    def invoke(self, context, event):
+        self.filepath = "gx_profile.json" if self.format == 'JSON' else "gx_trace.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        path = bpy.path.abspath(self.filepath)
+        if self.format == 'JSON':
+            profiler.export_json(path)
+        else:
+            profiler.export_chrome_trace(path)
+        self.report({'INFO'}, "Profile written to " + path)
+        return {'FINISHED'}
+
+class GxProfileReset(bpy.types.Operator):
+
+    bl_idname = "object.gx_profile_reset"
+    bl_label = "Reset Profile"
+
+    def execute(self, context):
+        profiler.reset()
+        return {'FINISHED'}
+
+def update_profile(self, context):
+    profiler.enabled = context.scene.gx_profile
+
 def update_custom_object(self, context):
    pass
 
 def update_space_array(self, context):
-    for i in range(bpy.context.scene['gx_count_x']):
-        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_l_" + str(i+1)
-            bpy.data.objects[name].modifiers['Array'].relative_offset_displace[2] = bpy.context.scene['gx_space_array']
-        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_r_" + str(i+1)
-            bpy.data.objects[name].modifiers['Array'].relative_offset_displace[2] = bpy.context.scene['gx_space_array']
+    schedule_update('array')
 
 def update_merge_array(self, context):
-    for i in range(bpy.context.scene['gx_count_x']):
-        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_l_" + str(i+1)
-            bpy.data.objects[name].modifiers['Array'].use_merge_vertices = bpy.context.scene['gx_array_merge']
-        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_r_" + str(i+1)
-            bpy.data.objects[name].modifiers['Array'].use_merge_vertices = bpy.context.scene['gx_array_merge']
+    schedule_update('array')
+
+@profiler.profiled('update.array')
+def apply_array():
+    for prefix, sign in bar_sides():
+        for item in registry(prefix):
+            if item.bar is not None and item.bar.modifiers.get('Array') is not None:
+                item.bar.modifiers['Array'].relative_offset_displace[2] = bpy.context.scene['gx_space_array']
+                item.bar.modifiers['Array'].use_merge_vertices = bpy.context.scene['gx_array_merge']
+
+@profiler.profiled('update.layout')
+def update_layout():
+    """
+    Places the bars and helper empties for gx_space_x, gx_center_space and gx_slash
+    The layout is computed for all bars at once, the writes are per object
+    for the reasons given at apply_scale.
+    """
+    for prefix, sign in bar_sides():
+        items = registry(prefix)
+        loc, rot = bar_layout(len(items), sign)
+        for i, item in enumerate(items):
+            if item.bar is not None:
+                profiler.count('objects')
+                item.bar.location[0:2] = loc[i, :2]
+                item.bar.rotation_euler[2] = rot
+            if item.helper is not None:
+                item.helper.location[0:2] = loc[i, :2]
 
 def update_slash(self, context):
-    for i in range(bpy.context.scene['gx_count_x']):
-        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_l_" + str(i+1)
-            bpy.data.objects[name].location[1] = bpy.context.scene['gx_slash'] * i
-            if bpy.context.scene['gx_slash_rotate'] == True:
-                bpy.data.objects[name].rotation_euler[2] = -math.asin(bpy.context.scene['gx_slash']/math.sqrt(math.pow(bpy.context.scene['gx_space_x'],2) + math.pow(bpy.context.scene['gx_slash'],2)))
-            else:
-                bpy.data.objects[name].rotation_euler[2] = 0
-        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_r_" + str(i+1)
-            bpy.data.objects[name].location[1] = bpy.context.scene['gx_slash'] * i
-            if bpy.context.scene['gx_slash_rotate'] == True:
-                bpy.data.objects[name].rotation_euler[2] = math.asin(bpy.context.scene['gx_slash']/math.sqrt(math.pow(bpy.context.scene['gx_space_x'],2) + math.pow(bpy.context.scene['gx_slash'],2)))
-            else:
-                bpy.data.objects[name].rotation_euler[2] = 0
-    try:
-        bpy.types.Scene.bakedobjects
-        for i in range(bpy.types.Scene.bakedobjects):
-            if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-                name = "obj_l_" + str(i+1)
-                bpy.data.objects[name].location[1] = bpy.context.scene['gx_slash'] * i
-            if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-                name = "obj_r_" + str(i+1)
-                bpy.data.objects[name].location[1] = bpy.context.scene['gx_slash']  * i
-    except:
-        False
+    schedule_update('layout')
 
+@profiler.profiled('drivering')
 def drivering(i):
-    if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-        name = "bar_l_" + str(i+1)
-        name2 = "obj_l_" + str(i+1)
-        try:
-            bpy.data.objects[name2]
-            if bpy.context.scene['gx_type'] == 0:
-                try:
-                    bpy.data.objects[name].modifiers['Array'].driver_remove('count')
-                except:
-                    False
-                obj = bpy.data.objects[name] #def drivering
-                mdf = obj.modifiers['Array'].driver_add('count')
-                drv = mdf.driver
-                drv.type = 'AVERAGE'
-                var = drv.variables.new()
-                var.name = 'name'
-                var.type = 'TRANSFORMS'
-                targ = var.targets[0]
-                targ.id = bpy.data.objects[name2]
-                targ.transform_type = 'SCALE_Z'
-                targ.bone_target = 'Driver'
-                fmod = mdf.modifiers[0]
-                fmod.poly_order = 1
-                fmod.coefficients = (0.0, bpy.context.scene['gx_driver_power'])
-
-            elif bpy.context.scene['gx_type'] == 1 or bpy.context.scene['gx_type'] == 2:
-                try:
-                    bpy.data.objects[name].driver_remove('scale', 2)
-                except:
-                    False
-                obj = bpy.data.objects[name] #def drivering
-                mdf = obj.driver_add('scale', 2)
-                drv = mdf.driver
-                drv.type = 'AVERAGE'
-                var = drv.variables.new()
-                var.name = 'name'
-                var.type = 'TRANSFORMS'
-                targ = var.targets[0]
-                targ.id = bpy.data.objects[name2]
-                targ.transform_type = 'SCALE_Z'
-                targ.bone_target = 'Driver'
-                fmod = mdf.modifiers[0]
-                fmod.poly_order = 1
-                fmod.coefficients = (0.0, bpy.context.scene['gx_driver_power'])
-        except:
-            False
-
-    if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-        name = "bar_r_" + str(i+1)
-        name2 = "obj_r_" + str(i+1)
-        try:
-            bpy.data.objects[name2]
-            if bpy.context.scene['gx_type'] == 0:
-                try:
-                    bpy.data.objects[name].modifiers['Array'].driver_remove('count')
-                except:
-                    False
-                obj = bpy.data.objects[name] #def drivering
-                mdf = obj.modifiers['Array'].driver_add('count')
-                drv = mdf.driver
-                drv.type = 'AVERAGE'
-                var = drv.variables.new()
-                var.name = 'name'
-                var.type = 'TRANSFORMS'
-                targ = var.targets[0]
-                targ.id = bpy.data.objects[name2]
-                targ.transform_type = 'SCALE_Z'
-                targ.bone_target = 'Driver'
-                fmod = mdf.modifiers[0]
-                fmod.poly_order = 1
-                fmod.coefficients = (0.0, bpy.context.scene['gx_driver_power'])
-
-            elif bpy.context.scene['gx_type'] == 1 or bpy.context.scene['gx_type'] == 2:
-                try:
-                    bpy.data.objects[name].driver_remove('scale', 2)
-                except:
-                    False
-                obj = bpy.data.objects[name] #def drivering
-                mdf = obj.driver_add('scale', 2)
-                drv = mdf.driver
-                drv.type = 'AVERAGE'
-                var = drv.variables.new()
-                var.name = 'name'
-                var.type = 'TRANSFORMS'
-                targ = var.targets[0]
-                targ.id = bpy.data.objects[name2]
-                targ.transform_type = 'SCALE_Z'
-                targ.bone_target = 'Driver'
-                fmod = mdf.modifiers[0]
-                fmod.poly_order = 1
-                fmod.coefficients = (0.0, bpy.context.scene['gx_driver_power'])
-        except:
-            False
+    for prefix, sign in bar_sides():
+        obj = get_bar(prefix, i)
+        helper = get_helper(prefix, i)
+        if obj is None or helper is None:
+            continue
+        if bpy.context.scene['gx_type'] == 0:
+            array = obj.modifiers.get('Array')
+            if array is None:
+                continue
+            array.driver_remove('count')
+            mdf = array.driver_add('count')
+        elif bpy.context.scene['gx_type'] == 1 or bpy.context.scene['gx_type'] == 2:
+            obj.driver_remove('scale', 2)
+            mdf = obj.driver_add('scale', 2)
+        else:
+            continue
+        profiler.count('objects')
+        # a running preview drives the bars itself
+        mdf.mute = bool(previews)
+        drv = mdf.driver
+        drv.type = 'AVERAGE'
+        var = drv.variables.new()
+        var.name = 'name'
+        var.type = 'TRANSFORMS'
+        targ = var.targets[0]
+        targ.id = helper
+        targ.transform_type = 'SCALE_Z'
+        targ.bone_target = 'Driver'
+        fmod = mdf.modifiers[0]
+        fmod.poly_order = 1
+        fmod.coefficients = (0.0, bpy.context.scene['gx_driver_power'])
 
 def update_drivers():
     try:
@@ -753,208 +1259,226 @@ def update_drivers():
         False
 
 def update_drivers3(self, context):
-    try:
-        bpy.types.Scene.bakedobjects
-        for i in range(bpy.types.Scene.bakedobjects):
-            drivering(i)
-    except:
-        False
+    schedule_update('power')
 
-def update_drivers2():
+@profiler.profiled('update.power')
+def apply_power():
+    """
+    New gx_driver_power: rescales direct bake keys, or sets the coefficient
+    of the existing drivers instead of rebuilding them
+    """
+    if bpy.context.scene.get('gx_direct', False):
+        update_direct_power()
+        return
+    if bpy.context.scene['gx_type'] == 0:
+        data_path, index = 'modifiers["Array"].count', 0
+    else:
+        data_path, index = 'scale', 2
     try:
-        bpy.types.Scene.bakedobjects
-        for i in range(bpy.types.Scene.allobjects, bpy.types.Scene.bakedobjects):
-            drivering(i)
-    except:
-        False
+        baked = bpy.types.Scene.bakedobjects
+    except AttributeError:
+        return
+    for i in range(baked):
+        for prefix, sign in bar_sides():
+            obj = get_bar(prefix, i)
+            if obj is None or obj.animation_data is None:
+                continue
+            fcu = obj.animation_data.drivers.find(data_path, index=index)
+            if fcu is None or not len(fcu.modifiers):
+                drivering(i)
+                continue
+            fcu.modifiers[0].coefficients = (0.0, bpy.context.scene['gx_driver_power'])
 
 def update_channels(self, context):
     gxstart()
 
 def update_space_x(self, context):
-    for i in range(bpy.context.scene['gx_count_x']):
-        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_l_" + str(i+1)
-            bpy.data.objects[name].location[0] = -(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2)
-            if bpy.context.scene['gx_slash_rotate'] == True and (bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_slash']) != 0:
-                bpy.data.objects[name].rotation_euler[2] = -math.asin(bpy.context.scene['gx_slash']/math.sqrt(math.pow(bpy.context.scene['gx_space_x'],2) + math.pow(bpy.context.scene['gx_slash'],2)))
-            else:
-                bpy.data.objects[name].rotation_euler[2] = 0
-        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_r_" + str(i+1)
-            bpy.data.objects[name].location[0] = i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2
-            if bpy.context.scene['gx_slash_rotate'] == True and (bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_slash']) != 0:
-                bpy.data.objects[name].rotation_euler[2] = math.asin(bpy.context.scene['gx_slash']/math.sqrt(math.pow(bpy.context.scene['gx_space_x'],2) + math.pow(bpy.context.scene['gx_slash'],2)))
-            else:
-                bpy.data.objects[name].rotation_euler[2] = 0
-    try:
-        bpy.types.Scene.bakedobjects
-        for i in range(bpy.types.Scene.bakedobjects):
-            if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-                name = "obj_l_" + str(i+1)
-                bpy.data.objects[name].location[0] = -(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2)
-            if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-                name = "obj_r_" + str(i+1)
-                bpy.data.objects[name].location[0] = i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2
-    except:
-        False
+    schedule_update('layout')
 
 def update_scale(self, context):
-    for i in range(bpy.context.scene['gx_count_x']):
-        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_l_" + str(i+1)
-            if bpy.context.scene['gx_type'] == 0:
-                bpy.data.objects[name].scale = (bpy.context.scene['gx_scale_x'], bpy.context.scene['gx_scale_y'], bpy.context.scene['gx_scale_z'])
-            elif bpy.context.scene['gx_type'] == 1:
-                bpy.data.objects[name].scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z'])
-                #bpy.ops.object.transform_apply(scale=True)
-            elif bpy.context.scene['gx_type'] == 2:
-                bpy.data.objects[name].scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z']*2)
-                #bpy.ops.object.transform_apply(scale=True)
-        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            name = "bar_r_" + str(i+1)
-            if bpy.context.scene['gx_type'] == 0:
-                bpy.data.objects[name].scale = (bpy.context.scene['gx_scale_x'], bpy.context.scene['gx_scale_y'], bpy.context.scene['gx_scale_z'])
-            elif bpy.context.scene['gx_type'] == 1:
-                bpy.data.objects[name].scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z'])
-                #bpy.ops.object.transform_apply(scale=True)
-            elif bpy.context.scene['gx_type'] == 2:
-                bpy.data.objects[name].scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z']*2)
-                #bpy.ops.object.transform_apply(scale=True)
-
-def generate_objects(i):
-    gx_save = bpy.context.scene.cursor.location.copy()
-    if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-
-        if bpy.context.scene['gx_custom_object_b']==True:
-            try:
-                obname = bpy.context.scene['gx_custom_object']
-                old_ob = bpy.data.objects[obname]
-                new_ob = old_ob.copy()
-                bpy.context.scene.objects.link(new_ob)
-                new_ob.location = (-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, 0)
-                bpy.context.view_layer.objects.active=new_ob
-            except:bpy.ops.mesh.primitive_cube_add(location=(-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, 0))
-        else:
-              bpy.ops.mesh.primitive_cube_add(location=(-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, 0))
-        if bpy.context.scene['gx_slash_rotate'] == True:
-            bpy.context.active_object.rotation_euler[2] = -math.asin(bpy.context.scene['gx_slash']/math.sqrt(math.pow(bpy.context.scene['gx_space_x'],2) + math.pow(bpy.context.scene['gx_slash'],2)))
-
-        if bpy.context.scene['gx_type'] == 0:
-            bpy.context.active_object.scale = (bpy.context.scene['gx_scale_x'], bpy.context.scene['gx_scale_y'], bpy.context.scene['gx_scale_z'])
-        elif bpy.context.scene['gx_type'] == 1:
-            bpy.context.active_object.scale = (1, 1, 0.06)
-            bpy.ops.object.transform_apply(scale=True)
-            bpy.context.active_object.location[2] = 0.06
-            bpy.context.scene.cursor.location = (-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, 0)
-            bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
-            bpy.context.active_object.scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z'])
-        elif bpy.context.scene['gx_type'] == 2:
-            bpy.context.active_object.scale = (1, 1, 0.06*2)
-            bpy.ops.object.transform_apply(scale=True)
-            bpy.context.active_object.scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z']*2)
-
-        name = "bar_l_" + str(i+1)
-        bpy.context.active_object.name = name
-
-        if bpy.context.scene['gx_type'] == 0:
-            bpy.ops.object.modifier_add(type='ARRAY')
-            bpy.context.active_object.modifiers['Array'].count = 10
-            bpy.context.active_object.modifiers['Array'].relative_offset_displace[0] = 0
-            bpy.context.active_object.modifiers['Array'].relative_offset_displace[2] = bpy.context.scene['gx_space_array']
+    schedule_update('scale')
 
-    if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-        if bpy.context.scene['gx_custom_object_b']==True:
-            try:
-                obname = bpy.context.scene['gx_custom_object']
-                old_ob = bpy.data.objects[obname]
-                new_ob = old_ob.copy()
-                bpy.context.scene.objects.link(new_ob)
-                new_ob.location = (-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, 0)
-                bpy.context.view_layer.objects.active=new_ob
-            except:bpy.ops.mesh.primitive_cube_add(location=(-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, 0))
-        else:
-              bpy.ops.mesh.primitive_cube_add(location=(-(i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2), bpy.context.scene['gx_slash'] * i, 0))
+def bar_scale():
+    if bpy.context.scene['gx_type'] == 0:
+        return (bpy.context.scene['gx_scale_x'], bpy.context.scene['gx_scale_y'], bpy.context.scene['gx_scale_z'])
+    elif bpy.context.scene['gx_type'] == 1:
+        return (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z'])
+    return (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z']*2)
 
-        if bpy.context.scene['gx_slash_rotate'] == True:
-            bpy.context.active_object.rotation_euler[2] = math.asin(bpy.context.scene['gx_slash']/math.sqrt(math.pow(bpy.context.scene['gx_space_x'],2) + math.pow(bpy.context.scene['gx_slash'],2)))
-
-        if bpy.context.scene['gx_type'] == 0:
-            bpy.context.active_object.scale = (bpy.context.scene['gx_scale_x'], bpy.context.scene['gx_scale_y'], bpy.context.scene['gx_scale_z'])
-        elif bpy.context.scene['gx_type'] == 1:
-            bpy.context.active_object.scale = (1, 1, 0.06)
-            bpy.ops.object.transform_apply(scale=True)
-            bpy.context.active_object.location[2] = 0.06
-            bpy.context.scene.cursor.location = (i*bpy.context.scene['gx_space_x'] + bpy.context.scene['gx_center_space']/2, bpy.context.scene['gx_slash'] * i, 0)
-            bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
-            bpy.context.active_object.scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z'])
-        elif bpy.context.scene['gx_type'] == 2:
-            bpy.context.active_object.scale = (1, 1, 0.06*2)
-            bpy.ops.object.transform_apply(scale=True)
-            bpy.context.active_object.scale = (bpy.context.scene['gx_cube_scale_x'], bpy.context.scene['gx_cube_scale_y'], bpy.context.scene['gx_cube_scale_z']*2)
-
-        name = "bar_r_" + str(i+1)
-        bpy.context.active_object.name = name
+@profiler.profiled('update.scale')
+def apply_scale():
+    """
+    Scales every bar. Written per object: foreach_set would write the raw
+    arrays without RNA updates, so each bar would still need its own
+    update_tag() for the depsgraph, and the bars share their collection
+    with the user's objects, so there is no collection of just the bars.
+    """
+    scale = bar_scale()
+    for prefix, sign in bar_sides():
+        for item in registry(prefix):
+            if item.bar is not None:
+                profiler.count('objects')
+                item.bar.scale = scale
+
+# property changes waiting for flush_updates
+pending_updates = set()
+UPDATE_DELAY = 1.0 / 30
+
+def schedule_update(kind):
+    """
+    Records a property change for the next flush_updates tick. A slider drag
+    fires its update callback on every step; coalesced, each kind of change
+    costs one pass over the bars per tick however many steps came in.
+    """
+    profiler.count('update_requests')
+    pending_updates.add(kind)
+    if not bpy.app.timers.is_registered(flush_updates):
+        bpy.app.timers.register(flush_updates, first_interval=UPDATE_DELAY)
 
-        if bpy.context.scene['gx_type'] == 0:
-            bpy.ops.object.modifier_add(type='ARRAY')
-            bpy.context.active_object.modifiers['Array'].count = 10
-            bpy.context.active_object.modifiers['Array'].relative_offset_displace[0] = 0
-            bpy.context.active_object.modifiers['Array'].relative_offset_displace[2] = bpy.context.scene['gx_space_array']
-    bpy.context.scene.cursor.location = gx_save
+@bpy.app.handlers.persistent
+def reconcile_after_undo(scene, *args):
+    """
+    undo_post/redo_post: a step taken between a count change and its flush
+    holds the new gx_count_x with the old bars. Editing data inside an undo
+    handler corrupts the undo stack, so only a flush is scheduled here.
+    """
+    if scene.get('gx_init') is None:
+        return
+    count = scene['gx_count_x']
+    if single_mesh():
+        obj = bpy.data.objects.get(BAR_MESH)
+        stale = obj is not None and len(bar_keys(obj)) != count * len(bar_sides())
+    else:
+        stale = (any(get_bar(prefix, count - 1) is None for prefix, sign in bar_sides())
+                 or any(get_bar(prefix, count) is not None for prefix in REGISTRY))
+    if stale:
+        schedule_update('count')
+
+@profiler.profiled('update.flush')
+def flush_updates():
+    kinds = set(pending_updates)
+    pending_updates.clear()
+    if single_mesh():
+        # one rebuild covers layout, scale and count, power only reshapes the keys
+        if kinds & {'count', 'layout', 'scale'}:
+            build_bar_mesh()
+        elif 'power' in kinds and bpy.data.objects.get(BAR_MESH) is not None:
+            set_bar_rise(bpy.data.objects[BAR_MESH])
+        return None
+    if 'count' in kinds:
+        apply_count()
+    if 'layout' in kinds:
+        update_layout()
+    if 'scale' in kinds:
+        apply_scale()
+    if 'array' in kinds:
+        apply_array()
+    if 'power' in kinds:
+        apply_power()
+    return None
+
+def bar_mesh(name):
+    """
+    The cube primitive_cube_add made, with the z scale the operators used
+    to apply baked in: a slab standing on z 0 for gx_type 1, centred for 2
+    """
+    bottom, top = {1: (0.0, BAR_HEIGHT), 2: (-BAR_HEIGHT, BAR_HEIGHT)}.get(bpy.context.scene['gx_type'], (-1.0, 1.0))
+    verts = CUBE_CORNERS * (1.0, 1.0, top - bottom) + (0.0, 0.0, bottom)
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(verts.tolist(), [], CUBE_FACES.tolist())
+    mesh.update()
+    return mesh
+
+def new_bar(prefix, i, sign):
+    """
+    Bar i of a channel, built at data level: no operator needs a window or
+    changes the selection, so flush_updates can run it from its timer
+    """
+    scene = bpy.context.scene
+    name = prefix + str(i+1)
+    obj = None
+    if scene['gx_custom_object_b'] == True:
+        source = bpy.data.objects.get(scene['gx_custom_object'])
+        if source is not None:
+            obj = source.copy()
+            obj.name = name
+    if obj is None:
+        obj = bpy.data.objects.new(name, bar_mesh(name))
+    scene.collection.objects.link(obj)
+    loc, rot = bar_layout(i + 1, sign)
+    obj.location = loc[i]
+    obj.rotation_euler[2] = rot
+    obj.scale = bar_scale()
+    if scene['gx_type'] == 0:
+        array = obj.modifiers.new('Array', 'ARRAY')
+        array.count = 10
+        array.relative_offset_displace = (0, 0, scene['gx_space_array'])
+    bar_slot(prefix, i).bar = obj
+    profiler.count('objects')
+    return obj
+
+@profiler.profiled('generate_objects')
+def generate_objects(i):
+    for prefix, sign in bar_sides():
+        new_bar(prefix, i, sign)
 
 def update_count(self, context):
-    if bpy.types.Scene.allobjects > bpy.context.scene['gx_count_x']:
-        bpy.ops.object.select_all(action="DESELECT")
-        for i in range(bpy.context.scene['gx_count_x'], bpy.types.Scene.allobjects):
-            if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-                name = "bar_l_" + str(i+1)
-                bpy.data.objects[name].select_set(True)
-            if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-                name = "bar_r_" + str(i+1)
-                bpy.data.objects[name].select_set(True)
-        bpy.ops.object.delete()
-
-        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            bpy.context.view_layer.objects.active = bpy.data.objects["bar_l_" + str(bpy.context.scene['gx_count_x'])]
-            bpy.ops.object.select_pattern(pattern="bar_l_" + str(bpy.context.scene['gx_count_x']))
-        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            bpy.context.view_layer.objects.active = bpy.data.objects["bar_r_" + str(bpy.context.scene['gx_count_x'])]
-            bpy.ops.object.select_pattern(pattern="bar_r_" + str(bpy.context.scene['gx_count_x']))
-
-        bpy.types.Scene.allobjects = bpy.context.scene['gx_count_x']
-    elif bpy.types.Scene.allobjects < bpy.context.scene['gx_count_x']:
-        for i in range(bpy.types.Scene.allobjects, bpy.context.scene['gx_count_x']):
+    schedule_update('count')
 
+@profiler.profiled('update.count')
+def apply_count():
+    """
+    Applies a count change as a diff: surplus bars are removed, missing ones
+    created, and every other bar is left as it is
+    """
+    count = bpy.context.scene['gx_count_x']
+    for prefix in REGISTRY:
+        remove_bars(prefix, count)
+    created = []
+    for i in range(count):
+        if any(get_bar(prefix, i) is None for prefix, sign in bar_sides()):
+            for prefix, sign in bar_sides():
+                remove_object(get_bar(prefix, i))
             generate_objects(i)
-            try:
-                if bpy.types.Scene.allobjects < bpy.types.Scene.bakedobjects:
-                    update_drivers2()
-            except:
-                False
-
-        if bpy.context.scene['gx_channels'] == 1 or bpy.context.scene['gx_channels'] == 0:
-            bpy.context.view_layer.objects.active = bpy.data.objects["bar_l_" + str(bpy.context.scene['gx_count_x'])]
-            bpy.ops.object.select_pattern(pattern="bar_l_" + str(bpy.context.scene['gx_count_x']))
-        if bpy.context.scene['gx_channels'] == 2 or bpy.context.scene['gx_channels'] == 0:
-            bpy.context.view_layer.objects.active = bpy.data.objects["bar_r_" + str(bpy.context.scene['gx_count_x'])]
-            bpy.ops.object.select_pattern(pattern="bar_r_" + str(bpy.context.scene['gx_count_x']))
-
-        bpy.types.Scene.allobjects = bpy.context.scene['gx_count_x']
-    else:
-        False
+            created.append(i)
+    # new bars pick up the helpers or keys an earlier, larger bake left behind
+    for i in created:
+        drivering(i)
+    if created and bpy.context.scene.get('gx_direct_baked', False):
+        restore_direct_keys()
+    select_last_bar()
+    bpy.types.Scene.allobjects = count
 
 def register():
+    bpy.utils.register_class(GxBar)
     bpy.utils.register_class(GxCreateBase)
     bpy.utils.register_class(GxInitVariables)
     bpy.utils.register_class(GxBake)
+    bpy.utils.register_class(GxProfileExport)
+    bpy.utils.register_class(GxProfileReset)
     bpy.utils.register_class(GXAVPanel)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if reconcile_after_undo not in handlers:
+            handlers.append(reconcile_after_undo)
+    if stop_preview_on_load not in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.append(stop_preview_on_load)
     initprop()
 def unregister():
+    stop_preview()
+    if stop_preview_on_load in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(stop_preview_on_load)
     bpy.utils.unregister_class(GxCreateBase)
     bpy.utils.unregister_class(GxInitVariables)
     bpy.utils.unregister_class(GxBake)
     bpy.utils.unregister_class(GXAVPanel)
+    bpy.utils.unregister_class(GxProfileExport)
+    bpy.utils.unregister_class(GxProfileReset)
+    bpy.utils.unregister_class(GxBar)
+    if bpy.app.timers.is_registered(flush_updates):
+        bpy.app.timers.unregister(flush_updates)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if reconcile_after_undo in handlers:
+            handlers.remove(reconcile_after_undo)
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
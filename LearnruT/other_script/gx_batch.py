@@ -0,0 +1,255 @@
+
+"""
+Headless batch bake for the audio visualiser
+
+    python gx_batch.py album.json --jobs 4
+    python gx_batch.py album.json --format blend --blender /path/to/blender
+
+The manifest lists the sound files and visualiser presets:
+
+    {"defaults": {"count": 64, "mode": 2, "fps": 30},
+     "jobs": [{"name": "track01", "left": "01_l.wav", "right": "01_r.wav",
+               "preset": {"attack": 0.01}, "output": "out/track01"}]}
+
+Preset keys are the DEFAULTS below: the gx_* scene properties without the
+prefix (count is gx_count_x), plus fps. Unknown keys are an error.
+'npz' jobs run the pure NumPy analysis in worker processes and write the
+envelopes; 'blend' jobs run one background Blender per job (gxstart + gxbake)
+and save a .blend. Either way at most --jobs jobs are in flight.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import gx_spectrum
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+
+# the values initpropvalues sets, so both formats bake alike by default
+DEFAULTS = {
+    'count': 32,
+    'mode': 2,
+    'min_freq': 10.0,
+    'max_freq': 20000.0,
+    'channels': 0,
+    'start': 100,
+    'fps': 24,
+    'attack': 0.005,
+    'release': 0.2,
+    'threshold': 0.0,
+    'accumulate': False,
+    'additive': False,
+    'square': False,
+    'sthreshold': 0.1,
+}
+
+# scene property each preset key sets, fps goes to the render settings
+SCENE_PROPS = dict((key, 'gx_' + key) for key in DEFAULTS if key != 'fps')
+SCENE_PROPS['count'] = 'gx_count_x'
+
+
+def load_manifest(path):
+    """
+    :return: list of jobs with the preset merged over the defaults and
+        paths made absolute relative to the manifest
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    check_preset(manifest.get('defaults', {}), 'defaults')
+    defaults = dict(DEFAULTS, **manifest.get('defaults', {}))
+    jobs = []
+    for index, job in enumerate(manifest['jobs']):
+        name = job.get('name') or 'job_%03d' % index
+        check_preset(job.get('preset', {}), name)
+        preset = dict(defaults, **job.get('preset', {}))
+        files = {}
+        for side in ('left', 'right'):
+            if job.get(side):
+                files[side] = os.path.join(base, job[side])
+        jobs.append({
+            'name': name,
+            'files': files,
+            'preset': preset,
+            'output': os.path.join(base, job.get('output') or os.path.join('out', name)),
+        })
+    return jobs
+
+
+def check_preset(preset, where):
+    unknown = sorted(set(preset) - set(DEFAULTS))
+    if unknown:
+        raise ValueError("%s: unknown preset keys %s" % (where, ", ".join(unknown)))
+
+
+def channel_sides(channels):
+    """
+    Channel names gxbake bakes for a gx_channels value
+    """
+    return {0: ['left', 'right'], 1: ['left'], 2: ['right']}[int(channels)]
+
+
+def job_sides(job):
+    """
+    Channels the job bakes, every one of them needs a file in the manifest
+    """
+    sides = channel_sides(job['preset']['channels'])
+    missing = [side for side in sides if side not in job['files']]
+    if missing:
+        raise ValueError("no %s file in the manifest" % " or ".join(missing))
+    return sides
+
+
+def bake_npz(job, cache_dir=None):
+    """
+    Worker: envelopes of every channel of one job into <output>.npz
+    """
+    start = time.time()
+    preset = job['preset']
+    edges = gx_spectrum.band_edges(int(preset['mode']), int(preset['count']),
+                                   preset['min_freq'], preset['max_freq'])
+    sides = job_sides(job)
+    cache = gx_spectrum.SpectrumCache(cache_dir) if cache_dir else None
+    results = gx_spectrum.bake_many(
+        [job['files'][side] for side in sides], edges, float(preset['fps']),
+        attack=preset['attack'], release=preset['release'], threshold=preset['threshold'],
+        accumulate=preset['accumulate'], additive=preset['additive'], square=preset['square'],
+        sthreshold=preset['sthreshold'], cache=cache, workers=1)
+    failed = [side for side, values in zip(sides, results) if values is None]
+    if failed:
+        raise RuntimeError("could not bake " + ", ".join(failed))
+    arrays = dict(zip(sides, results))
+    path = job['output'] + '.npz'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, edges=np.asarray(edges, dtype=np.float32), fps=float(preset['fps']),
+             start=int(preset['start']), **arrays)
+    return {'output': path, 'frames': max(len(v) for v in results) if results else 0,
+            'seconds': time.time() - start}
+
+
+def bake_blend(job, blender, timeout=None):
+    """
+    Worker thread: one background Blender process bakes and saves the job
+    """
+    start = time.time()
+    job_sides(job)
+    os.makedirs(os.path.dirname(job['output']) or '.', exist_ok=True)
+    job_path = job['output'] + '.job.json'
+    with open(job_path, 'w') as f:
+        json.dump(job, f)
+    try:
+        proc = subprocess.run([blender, '-b', '--factory-startup', '--python', os.path.abspath(__file__),
+                               '--', '--worker', job_path],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+    finally:
+        os.remove(job_path)
+    path = job['output'] + '.blend'
+    if proc.returncode != 0 or not os.path.exists(path):
+        tail = proc.stdout.decode('utf-8', 'replace').strip().splitlines()[-5:]
+        raise RuntimeError("blender exited with %d: %s" % (proc.returncode, " | ".join(tail)))
+    return {'output': path, 'seconds': time.time() - start}
+
+
+def run_in_blender(job_path):
+    """
+    Inside blender -b: builds the visualiser for one job and saves it
+    Scene values are set as ID properties, like initpropvalues does, so no
+    update callback or timer has to run.
+    """
+    import audio_visualisation
+
+    with open(job_path) as f:
+        job = json.load(f)
+    audio_visualisation.register()
+    scene = bpy.context.scene
+    audio_visualisation.initpropvalues()
+    for key, value in job['preset'].items():
+        if key == 'fps':
+            scene.render.fps = int(round(value))
+            scene.render.fps_base = scene.render.fps / float(value)
+        else:
+            scene[SCENE_PROPS[key]] = value
+    # gx_batch already runs --jobs bakes, each gets its share of the cores
+    audio_visualisation.bake_workers = job.get('workers')
+    scene['gx_left_file'] = job['files'].get('left', '')
+    scene['gx_right_file'] = job['files'].get('right', '')
+    audio_visualisation.gxstart()
+    audio_visualisation.gxbake()
+    audio_visualisation.update_drivers()
+    bpy.ops.wm.save_as_mainfile(filepath=job['output'] + '.blend')
+
+
+def run_jobs(jobs, submit, workers):
+    """
+    Bounded queue: never more than workers jobs submitted at a time
+    :return: report with one entry per job, in manifest order
+    """
+    report = [None] * len(jobs)
+    queue = list(enumerate(jobs))
+    running = {}
+    while queue or running:
+        while queue and len(running) < workers:
+            index, job = queue.pop(0)
+            running[submit(job)] = index
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = running.pop(future)
+            entry = {'name': jobs[index]['name']}
+            try:
+                entry.update(future.result())
+                entry['status'] = 'ok'
+            except Exception as e:
+                entry['status'] = 'failed'
+                entry['error'] = str(e)
+            report[index] = entry
+            print("%s: %s" % (entry['name'], entry.get('output') or entry['error']))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('manifest')
+    parser.add_argument('--format', choices=('npz', 'blend'), default='npz')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='jobs in flight at once')
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'))
+    parser.add_argument('--cache', help='spectrum cache directory for npz jobs')
+    parser.add_argument('--timeout', type=float, help='seconds per blender job')
+    parser.add_argument('--report', help='write the job report to this file')
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.manifest)
+    start = time.time()
+    if args.format == 'npz':
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            report = run_jobs(jobs, lambda job: pool.submit(bake_npz, job, args.cache), args.jobs)
+    else:
+        for job in jobs:
+            job['workers'] = max(1, (os.cpu_count() or 1) // args.jobs)
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            report = run_jobs(jobs, lambda job: pool.submit(bake_blend, job, args.blender, args.timeout),
+                              args.jobs)
+    failed = sum(entry['status'] != 'ok' for entry in report)
+    print("%d jobs, %d failed, %.1f s" % (len(report), failed, time.time() - start))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    if bpy is not None and '--worker' in sys.argv:
+        run_in_blender(sys.argv[sys.argv.index('--worker') + 1])
+    else:
+        sys.exit(main())
@@ -0,0 +1,130 @@
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Profiler(object):
+    """
+    Wall time and counters of named phases, nested phases included
+    Counters (operator calls, objects touched, keyframes...) go to the
+    innermost running phase. Disabled, phase() costs one attribute check.
+    """
+
+    def __init__(self, enabled=False, max_events=100000):
+        self.enabled = enabled
+        self.max_events = max_events
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.events = []
+            self.totals = {}
+            self.origin = time.perf_counter()
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    @contextmanager
+    def phase(self, name):
+        """
+        with profiler.phase('bake.analysis'): ...
+        """
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        counters = {}
+        stack.append(counters)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self._record(name, start, duration, counters)
+
+    def _record(self, name, start, duration, counters):
+        with self.lock:
+            total = self.totals.get(name)
+            if total is None:
+                total = self.totals[name] = {'calls': 0, 'seconds': 0.0, 'max': 0.0}
+            total['calls'] += 1
+            total['seconds'] += duration
+            total['max'] = max(total['max'], duration)
+            for key, value in counters.items():
+                total[key] = total.get(key, 0) + value
+            if len(self.events) < self.max_events:
+                self.events.append((name, start - self.origin, duration, threading.get_ident(), counters))
+
+    def profiled(self, name):
+        """
+        Decorator running every call of the function as a phase
+        """
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, key, n=1):
+        """
+        Adds n to a counter of the innermost running phase
+        """
+        if not self.enabled:
+            return
+        stack = self._stack()
+        if stack:
+            stack[-1][key] = stack[-1].get(key, 0) + n
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls an operator (or anything) and counts it as one 'ops'
+        """
+        self.count('ops')
+        return func(*args, **kwargs)
+
+    def summary(self):
+        """
+        :return: list of (name, totals dict), slowest first
+        """
+        with self.lock:
+            items = [(name, dict(total)) for name, total in self.totals.items()]
+        return sorted(items, key=lambda item: -item[1]['seconds'])
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({'phases': dict(self.summary())}, f, indent=2)
+
+    def export_chrome_trace(self, path):
+        """
+        Trace Event Format, opens in chrome://tracing or ui.perfetto.dev
+        """
+        with self.lock:
+            events = list(self.events)
+        trace = [{
+            'name': name,
+            'cat': name.split('.')[0],
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': duration * 1e6,
+            'pid': os.getpid(),
+            'tid': tid,
+            'args': counters,
+        } for name, start, duration, tid, counters in events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+# the visualiser's profiler, enabled from the panel
+profiler = Profiler()
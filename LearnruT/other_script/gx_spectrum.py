@@ -0,0 +1,1142 @@
+
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+try:
+    import aud
+except ImportError:
+    aud = None
+
+
+# Envelope attack/release reach this fraction of the target after
+# attack/release seconds, same as audaspace's Envelope sound.
+ARTHRESHOLD = 0.1
+
+FFT_SIZE = 2048
+HOP = 256
+BLOCK_FRAMES = 1024
+CHUNK_SAMPLES = 1 << 18
+# bake_many streams files longer than this instead of loading them whole
+STREAM_SECONDS = 600
+
+base = math.pow(2, (1. / 3))
+
+def compute(xarg):
+    """
+    Computes value of tercja function ignoring set bounds
+    :param xarg: x argument for func
+    :return: computed y value
+    """
+    return base ** xarg
+
+def compute_inverse(yarg):
+    """
+    Computes inverse of tercja
+    :param yarg: y argument for func
+    :return: corresponding x value
+    """
+    # non positive numbers are out of domain of log func
+    #we are silently ignoring it
+    if yarg <= 0:
+        return 0
+    return math.log(yarg, base)
+
+
+def get_value_from_x(xx, minimum_x, maximum_x):
+    """
+    Computes value from percentage in interval. For more details please see:
+    https://github.com/Xevaquor/GXAudioVisualisation/wiki/Tercja
+    Eg: .42 means 42%
+    :param xx: Percent in interval. Must be in range [0,1]
+    :param minimum_x: Lower x bound
+    :param maximum_x: Upper x bound
+    :return: corresponding value of Tercja func
+    """
+    assert (0 <= xx <= 1)
+    return compute(xx * (maximum_x - minimum_x) + minimum_x)
+
+
+@lru_cache(maxsize=32)
+def band_layout(mode, count, min_freq, max_freq):
+    """
+    Frequency band of every bar, as laid out by gxbake, computed as arrays
+    :param mode: 0 logarithm, 1 linear, 2 tercja
+    :param count: number of bars
+    :return: read only (count, 2) array of (low, high) in Hz
+    """
+    i = np.arange(count, dtype=np.float64)
+    span = max_freq - min_freq
+    if mode == 2:
+        x_min = compute_inverse(min_freq)
+        x_max = compute_inverse(max_freq)
+        high = base ** ((i + 1) / count * (x_max - x_min) + x_min)
+        low = np.concatenate([[min_freq], high[:-1]])
+    elif mode == 1:
+        c = span / count
+        high = (span - c * (count - i - 1)) + min_freq
+        low = (span - c * (count - i)) + min_freq
+    elif mode == 0:
+        high = (1 - np.log(count - i) / math.log(count + 1)) * span + min_freq
+        low = (1 - np.log(count - i + 1) / math.log(count + 1)) * span + min_freq
+    else:
+        raise ValueError("Unknown frequency mode: %r" % (mode,))
+    edges = np.stack([low, high], axis=1)
+    edges.flags.writeable = False
+    return edges
+
+
+def band_edges(mode, count, min_freq, max_freq):
+    """
+    band_layout as a list of (low, high) tuples
+    """
+    return [tuple(edge) for edge in band_layout(int(mode), int(count), float(min_freq), float(max_freq)).tolist()]
+
+
+def load_audio(filepath):
+    """
+    Decodes a sound file to mono float32 samples
+    Uses Blender's audaspace when available, otherwise reads PCM wav.
+    :return: (samples, rate)
+    """
+    if aud is not None:
+        sound = aud.Sound(filepath)
+        rate = int(sound.specs[0])
+        data = np.asarray(sound.data(), dtype=np.float32)
+    else:
+        with wave.open(filepath, 'rb') as f:
+            rate = f.getframerate()
+            channels = f.getnchannels()
+            width = f.getsampwidth()
+            raw = f.readframes(f.getnframes())
+        data = pcm_to_float(raw, width).reshape(-1, channels)
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    return data.astype(np.float32), rate
+
+
+def pcm_to_float(raw, width):
+    if width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    if width == 2:
+        return np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+    if width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        v = np.where(v & 0x800000, v - 0x1000000, v)
+        return v.astype(np.float32) / 8388608
+    if width == 4:
+        return np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648
+    raise ValueError("Unsupported sample width: %d" % width)
+
+
+def wav_memmap(filepath):
+    """
+    Memory maps the sample data of a PCM or float wav file
+    :return: (memmap of shape (frames, channels[, 3]), rate, sample width)
+    """
+    with open(filepath, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError("Not a wav file: " + filepath)
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("No data chunk: " + filepath)
+            chunk_id, size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                data = f.read(size + (size & 1))
+                tag, channels, rate, _, _, bits = struct.unpack('<HHIIHH', data[:16])
+                if tag == 0xFFFE:
+                    # WAVE_FORMAT_EXTENSIBLE, the real tag starts the sub format guid
+                    tag = struct.unpack('<H', data[24:26])[0]
+                fmt = (tag, channels, rate, bits)
+            elif chunk_id == b'data':
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), 1)
+    if fmt is None:
+        raise ValueError("No fmt chunk: " + filepath)
+    tag, channels, rate, bits = fmt
+    width = bits // 8
+    # streamed wavs may leave the data size at 0 or 0xFFFFFFFF
+    size = os.path.getsize(filepath) - offset if size in (0, 0xFFFFFFFF) else size
+    size = min(size, os.path.getsize(filepath) - offset)
+    frames = size // (width * channels)
+    if tag == 3 and width in (4, 8):
+        dtype, shape = '<f%d' % width, (frames, channels)
+    elif tag == 1 and width == 3:
+        dtype, shape = np.uint8, (frames, channels, 3)
+    elif tag == 1 and width in (1, 2, 4):
+        dtype, shape = {1: np.uint8, 2: '<i2', 4: '<i4'}[width], (frames, channels)
+    else:
+        raise ValueError("Unsupported wav format %d/%d bit" % (tag, bits))
+    return np.memmap(filepath, dtype=dtype, mode='r', offset=offset, shape=shape), rate, width
+
+
+def _mono(block, width):
+    """
+    float32 mono samples from a block of a wav_memmap
+    """
+    if block.dtype.kind == 'f':
+        data = block.astype(np.float32)
+    else:
+        data = pcm_to_float(np.ascontiguousarray(block).tobytes(), width).reshape(len(block), -1)
+    return data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+
+
+def audio_info(filepath):
+    """
+    :return: (sample rate, length in samples) without decoding the file
+    """
+    try:
+        data, rate, _ = wav_memmap(filepath)
+        return rate, len(data)
+    except (ValueError, struct.error):
+        if aud is None:
+            raise
+    sound = aud.Sound(filepath)
+    return int(sound.specs[0]), int(sound.length)
+
+
+def is_long(filepath, seconds=STREAM_SECONDS):
+    try:
+        rate, length = audio_info(filepath)
+    except Exception:
+        return False
+    return length > rate * seconds
+
+
+def open_stream(filepath, chunk=CHUNK_SAMPLES):
+    """
+    Reads a sound file as mono float32 chunks of at most chunk samples
+    Wav data is memory mapped, other formats are decoded piecewise with
+    audaspace, so memory use doesn't depend on the length of the file.
+    :return: (rate, iterator of chunks)
+    """
+    try:
+        data, rate, width = wav_memmap(filepath)
+    except (ValueError, struct.error):
+        if aud is None:
+            raise
+        sound = aud.Sound(filepath)
+        rate = int(sound.specs[0])
+        length = int(sound.length)
+
+        def decode():
+            for start in range(0, length, chunk):
+                part = np.asarray(sound.limit(start / float(rate),
+                                              min(start + chunk, length) / float(rate)).data(),
+                                  dtype=np.float32)
+                yield part.mean(axis=1) if part.ndim > 1 else part
+        return rate, decode()
+
+    def read():
+        for start in range(0, len(data), chunk):
+            yield _mono(data[start:start + chunk], width)
+    return rate, read()
+
+
+class Filterbank(object):
+    """
+    FFT bins of every band: bins [lo, hi) of band i are summed
+    Every band is one run of bins, so only the window of bins used by any
+    band is kept as a (bins, bands) 0/1 matrix and applied as one product.
+    Bands narrower than one bin take the bin nearest to their centre.
+    """
+
+    def __init__(self, edges, rate, fft_size=FFT_SIZE):
+        freqs = np.fft.rfftfreq(fft_size, 1.0 / rate)
+        edges = np.asarray(edges, dtype=np.float64).reshape(-1, 2)
+        lo = np.searchsorted(freqs, edges[:, 0], side='left')
+        hi = np.searchsorted(freqs, edges[:, 1], side='left')
+        empty = hi <= lo
+        nearest = np.abs(freqs[:, None] - edges.mean(axis=1)[None, :]).argmin(axis=0)
+        self.lo = np.where(empty, nearest, lo)
+        self.hi = np.where(empty, nearest + 1, hi)
+        self.freqs = freqs
+        self.first = int(self.lo.min()) if len(edges) else 0
+        self.last = int(self.hi.max()) if len(edges) else 0
+        bins = np.arange(self.first, self.last)[:, None]
+        self.matrix = ((bins >= self.lo[None, :]) & (bins < self.hi[None, :])).astype(np.float32)
+
+    def apply(self, mag):
+        """
+        :param mag: (frames, bins) magnitudes
+        :return: (frames, bands) peak amplitudes
+        """
+        mag = mag[:, self.first:self.last]
+        return np.sqrt((mag * mag).dot(self.matrix))
+
+    def bin_range(self, band):
+        """
+        (low, high) Hz actually covered by the bins of a band
+        """
+        step = self.freqs[1] - self.freqs[0]
+        return float(self.freqs[self.lo[band]] - step / 2), float(self.freqs[self.hi[band] - 1] + step / 2)
+
+
+@lru_cache(maxsize=32)
+def _filterbank(edges, rate, fft_size):
+    return Filterbank(edges, rate, fft_size)
+
+
+def filterbank(edges, rate, fft_size=FFT_SIZE):
+    """
+    Filterbank cached per band layout, sample rate and FFT size
+    """
+    return _filterbank(tuple(map(tuple, np.asarray(edges, dtype=np.float64).tolist())), int(rate), fft_size)
+
+
+def frame_block(samples, start, count, fft_size=FFT_SIZE, hop=HOP):
+    """
+    (count, fft_size) view of the STFT frames starting at frame start
+    Frame i is centred on sample i * hop, zero padded past both ends.
+    """
+    lo = start * hop - fft_size // 2
+    hi = lo + (count - 1) * hop + fft_size
+    segment = np.zeros(hi - lo, dtype=np.float32)
+    s0 = max(lo, 0)
+    s1 = min(hi, len(samples))
+    if s1 > s0:
+        segment[s0 - lo:s1 - lo] = samples[s0:s1]
+    stride = segment.strides[0]
+    return np.lib.stride_tricks.as_strided(
+        segment, shape=(count, fft_size), strides=(hop * stride, stride))
+
+
+def spectrogram_blocks(samples, fft_size=FFT_SIZE, hop=HOP, first=0, last=None):
+    """
+    Magnitude STFT of the samples, BLOCK_FRAMES frames at a time
+    Magnitudes are scaled so that the root of the summed squares of a band
+    is the peak amplitude of the band limited signal.
+    :return: generator of (first frame, (frames, bins) array)
+    """
+    window = np.hanning(fft_size).astype(np.float32)
+    # Parseval: band energy -> rms of the band limited signal -> sine peak
+    scale = math.sqrt(2.0 * 2.0 / (fft_size * np.sum(window ** 2)))
+
+    if last is None:
+        last = frame_count(samples, hop)
+    for start in range(first, last, BLOCK_FRAMES):
+        n = min(BLOCK_FRAMES, last - start)
+        frames = frame_block(samples, start, n, fft_size, hop)
+        yield start, (np.abs(np.fft.rfft(frames * window, axis=1)) * scale).astype(np.float32)
+
+
+class StftStream(object):
+    """
+    Incremental version of spectrogram_blocks for samples arriving in chunks
+    Only the samples of frames not yet computed are kept.
+    """
+
+    def __init__(self, fft_size=FFT_SIZE, hop=HOP):
+        self.fft_size = fft_size
+        self.hop = hop
+        window = np.hanning(fft_size).astype(np.float32)
+        self.window = window
+        self.scale = math.sqrt(2.0 * 2.0 / (fft_size * np.sum(window ** 2)))
+        # frame 0 is centred on sample 0
+        self.pending = np.zeros(fft_size // 2, dtype=np.float32)
+        self.frame = 0
+        self.samples = 0
+
+    def _frames(self, count):
+        blocks = []
+        for start in range(0, count, BLOCK_FRAMES):
+            n = min(BLOCK_FRAMES, count - start)
+            segment = self.pending[start * self.hop:(start + n - 1) * self.hop + self.fft_size]
+            stride = segment.strides[0]
+            frames = np.lib.stride_tricks.as_strided(
+                segment, shape=(n, self.fft_size), strides=(self.hop * stride, stride))
+            blocks.append((np.abs(np.fft.rfft(frames * self.window, axis=1)) * self.scale).astype(np.float32))
+        self.frame += count
+        self.pending = self.pending[count * self.hop:]
+        return blocks
+
+    def feed(self, samples):
+        """
+        :return: list of (frames, bins) magnitude blocks completed by samples
+        """
+        self.samples += len(samples)
+        self.pending = np.concatenate([self.pending, np.asarray(samples, dtype=np.float32)])
+        if len(self.pending) < self.fft_size:
+            return []
+        return self._frames((len(self.pending) - self.fft_size) // self.hop + 1)
+
+    def finish(self):
+        remaining = frame_count_n(self.samples, self.hop) - self.frame
+        if remaining <= 0:
+            return []
+        need = (remaining - 1) * self.hop + self.fft_size
+        if len(self.pending) < need:
+            self.pending = np.concatenate([self.pending, np.zeros(need - len(self.pending), np.float32)])
+        return self._frames(remaining)
+
+
+def frame_count(samples, hop=HOP):
+    return frame_count_n(len(samples), hop)
+
+
+def frame_count_n(n, hop=HOP):
+    """
+    frame_count of n samples, for streams that never hold them all
+    """
+    return max(1, -(-n // hop))
+
+
+def band_amplitudes(samples, rate, edges, fft_size=FFT_SIZE, hop=HOP):
+    """
+    Peak amplitude of every band for every STFT frame, in one pass
+    :return: (frames, bands) array and frames per second
+    """
+    bank = filterbank(edges, rate, fft_size)
+    out = np.empty((frame_count(samples, hop), len(edges)), dtype=np.float32)
+    for start, mag in spectrogram_blocks(samples, fft_size, hop):
+        out[start:start + len(mag)] = bank.apply(mag)
+    return out, rate / float(hop)
+
+
+def spectrogram_band_amplitudes(spectrogram, rate, edges, fft_size=FFT_SIZE, hop=HOP):
+    """
+    Same as band_amplitudes, from a (possibly memory mapped) spectrogram
+    """
+    bank = filterbank(edges, rate, fft_size)
+    out = np.empty((len(spectrogram), len(edges)), dtype=np.float32)
+    for start in range(0, len(spectrogram), BLOCK_FRAMES):
+        mag = np.asarray(spectrogram[start:start + BLOCK_FRAMES], dtype=np.float32)
+        out[start:start + len(mag)] = bank.apply(mag)
+    return out, rate / float(hop)
+
+
+class SpectrumCache(object):
+    """
+    On-disk cache of magnitude spectrograms, one .npy file per sound
+    Entries are keyed by the sha1 of the file content and the STFT settings,
+    so re-bakes with other band layouts or envelope options skip decoding.
+    The least recently used entries are evicted above max_bytes.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3):
+        if directory is None:
+            directory = os.environ.get('GX_SPECTRUM_CACHE') or os.path.join(
+                os.path.expanduser('~'), '.cache', 'gx_audio_visualisation')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.json')
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _temp_path(self):
+        """
+        A fresh temporary file of the cache directory, unique per writer, so
+        concurrent bakes never rename each other's half-written data
+        """
+        fd, path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        os.close(fd)
+        return path
+
+    def _write_json(self, path, data):
+        tmp = self._temp_path()
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _update_index(self, add=None, drop=()):
+        """
+        Merges into the index as it is on disk right now, so stamps other
+        processes saved meanwhile survive. The window between reading and
+        renaming can still lose an entry, which only costs a rehash.
+        """
+        index = self._load_index()
+        index.update(add or {})
+        for stamp in drop:
+            index.pop(stamp, None)
+        self._write_json(self.index_path, index)
+
+    def digest(self, filepath):
+        """
+        Content hash, remembered per (path, size, mtime) to skip rehashing
+        """
+        st = os.stat(filepath)
+        stamp = '%s|%d|%d' % (os.path.abspath(filepath), st.st_size, st.st_mtime_ns)
+        index = self._load_index()
+        if stamp in index:
+            return index[stamp]
+        h = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        self._update_index({stamp: h.hexdigest()})
+        return h.hexdigest()
+
+    def key(self, filepath, fft_size=FFT_SIZE, hop=HOP):
+        return '%s_%d_%d_v%d' % (self.digest(filepath), fft_size, hop, self.VERSION)
+
+    def get(self, filepath, fft_size=FFT_SIZE, hop=HOP):
+        """
+        :return: (memory mapped (frames, bins) float16 spectrogram, sample rate)
+        """
+        key = self.key(filepath, fft_size, hop)
+        data_path = os.path.join(self.directory, key + '.npy')
+        meta_path = os.path.join(self.directory, key + '.json')
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            # streamed, so filling the cache doesn't hold the whole file
+            rate, length = audio_info(filepath)
+            tmp = self._temp_path()
+            try:
+                self._fill(tmp, filepath, frame_count_n(length, hop), fft_size, hop)
+                os.replace(tmp, data_path)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            self._write_json(meta_path, {'rate': rate, 'fft_size': fft_size, 'hop': hop,
+                                         'source': os.path.abspath(filepath)})
+            self.evict(keep=key)
+        else:
+            now = time.time()
+            os.utime(data_path, (now, now))
+        with open(meta_path) as f:
+            rate = json.load(f)['rate']
+        return np.load(data_path, mmap_mode='r'), rate
+
+    def _fill(self, path, filepath, frames, fft_size, hop):
+        spectrogram = np.lib.format.open_memmap(
+            path, mode='w+', dtype=np.float16, shape=(frames, fft_size // 2 + 1))
+        try:
+            rate, chunks = open_stream(filepath)
+            stft = StftStream(fft_size, hop)
+            start = 0
+            for samples in chunks:
+                for mag in stft.feed(samples):
+                    spectrogram[start:start + len(mag)] = mag
+                    start += len(mag)
+            for mag in stft.finish():
+                spectrogram[start:start + len(mag)] = mag
+                start += len(mag)
+            spectrogram.flush()
+        finally:
+            # the map has to be closed before the file is renamed or removed
+            del spectrogram
+
+    def evict(self, keep=None):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.directory, name)
+            st = os.stat(path)
+            total += st.st_size
+            entries.append((st.st_mtime, st.st_size, name[:-len('.npy')]))
+        kept = set(key for mtime, size, key in entries)
+        for mtime, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            for ext in ('.npy', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, key + ext))
+                except OSError:
+                    pass
+            kept.discard(key)
+            total -= size
+        # forget the content hashes no entry uses any more
+        digests = set(key.split('_')[0] for key in kept)
+        stale = [stamp for stamp, digest in self._load_index().items() if digest not in digests]
+        if stale:
+            self._update_index(drop=stale)
+
+
+def envelope(amplitudes, frame_rate, attack, release, threshold, initial=None):
+    """
+    Attack/release follower of audaspace's Envelope sound, on all bands at once
+    :param initial: follower state carried over from the previous block
+    """
+    attack_c = ARTHRESHOLD ** (1.0 / (frame_rate * attack)) if attack > 0 else 0.0
+    release_c = ARTHRESHOLD ** (1.0 / (frame_rate * release)) if release > 0 else 0.0
+    data = np.where(amplitudes < threshold, 0, amplitudes)
+    out = np.empty_like(data)
+    last = np.zeros(data.shape[1], dtype=data.dtype) if initial is None else initial
+    for i in range(len(data)):
+        x = data[i]
+        coef = np.where(x > last, attack_c, release_c)
+        last = coef * (last - x) + x
+        out[i] = last
+    return out
+
+
+def resample(values, src_rate, dst_rate):
+    """
+    Linear resampling along the first axis
+    """
+    count = int(math.ceil(len(values) * dst_rate / src_rate))
+    pos = np.arange(count) * (src_rate / dst_rate)
+    i0 = np.minimum(pos.astype(np.int64), len(values) - 1)
+    i1 = np.minimum(i0 + 1, len(values) - 1)
+    frac = (pos - i0)[:, None].astype(values.dtype)
+    return values[i0] * (1 - frac) + values[i1] * frac
+
+
+def post_process(values, square=False, sthreshold=0.1, accumulate=False, additive=False):
+    """
+    square/accumulate/additive stages of Blender's Bake Sound to F-Curves
+    """
+    if square:
+        values = np.where(values >= sthreshold, 1.0,
+                          np.where(values <= -sthreshold, -1.0, 0.0)).astype(values.dtype)
+    if accumulate:
+        delta = np.diff(values, axis=0, prepend=np.zeros((1, values.shape[1]), values.dtype))
+        rise = np.maximum(delta, 0)
+        values = np.cumsum(delta + rise if additive else rise, axis=0)
+    elif additive:
+        values = np.cumsum(values, axis=0)
+    return values
+
+
+def decimate(values, tolerance):
+    """
+    Ramer-Douglas-Peucker on a curve sampled once per frame
+    Linear interpolation between the kept samples stays within tolerance of
+    every dropped sample (measured along the value axis, as the F-Curve is
+    evaluated per frame).
+    :return: sorted indices of the samples to key
+    """
+    count = len(values)
+    if count < 3 or tolerance <= 0:
+        return np.arange(count)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        t = np.arange(1, b - a) / float(b - a)
+        error = np.abs(values[a + 1:b] - (values[a] + (values[b] - values[a]) * t))
+        worst = int(error.argmax())
+        if error[worst] > tolerance:
+            mid = a + 1 + worst
+            keep[mid] = True
+            stack.append((a, mid))
+            stack.append((mid, b))
+    return np.flatnonzero(keep)
+
+
+class EnvelopeStream(object):
+    """
+    Incremental bake(): feed samples (or cached magnitudes) chunk by chunk
+    and get finished per-frame values back as soon as they are known. The
+    envelope follower, resampler and accumulators carry their state between
+    chunks, so the result matches bake() on the whole file.
+    """
+
+    def __init__(self, rate, edges, fps, attack=0.005, release=0.2, threshold=0.0,
+                 accumulate=False, additive=False, square=False, sthreshold=0.1,
+                 fft_size=FFT_SIZE, hop=HOP):
+        self.stft = StftStream(fft_size, hop)
+        self.bank = filterbank(edges, rate, fft_size)
+        self.bands = len(edges)
+        self.frame_rate = rate / float(hop)
+        self.fps = fps
+        self.options = dict(attack=attack, release=release, threshold=threshold,
+                            accumulate=accumulate, additive=additive, square=square,
+                            sthreshold=sthreshold)
+        self.follower = None
+        self.previous = None
+        self.env_count = 0
+        self.out_count = 0
+        self.post_in = np.zeros(self.bands, dtype=np.float32)
+        self.post_out = np.zeros(self.bands, dtype=np.float32)
+
+    def _envelope(self, mags):
+        if not mags:
+            return np.empty((0, self.bands), dtype=np.float32)
+        amplitudes = self.bank.apply(np.concatenate(mags))
+        values = envelope(amplitudes, self.frame_rate, self.options['attack'],
+                          self.options['release'], self.options['threshold'], self.follower)
+        self.follower = values[-1]
+        return values
+
+    def _resample(self, values, final):
+        if self.previous is not None:
+            values = np.concatenate([self.previous[None], values])
+        base = self.env_count - (self.previous is not None)
+        self.env_count = base + len(values)
+        if len(values):
+            self.previous = values[-1]
+        step = self.frame_rate / self.fps
+        if final:
+            limit = int(math.ceil(self.env_count / step))
+        else:
+            # frames whose right neighbour is already known
+            limit = int(math.ceil((self.env_count - 1) / step))
+        limit = max(limit, self.out_count)
+        pos = np.arange(self.out_count, limit) * step
+        self.out_count = limit
+        if not len(pos):
+            return np.empty((0, self.bands), dtype=np.float32)
+        i0 = np.minimum(pos.astype(np.int64), self.env_count - 1)
+        i1 = np.minimum(i0 + 1, self.env_count - 1)
+        frac = (pos - i0)[:, None].astype(np.float32)
+        return values[i0 - base] * (1 - frac) + values[i1 - base] * frac
+
+    def _post(self, values):
+        options = self.options
+        if not len(values):
+            return values
+        if options['square']:
+            st = options['sthreshold']
+            values = np.where(values >= st, 1.0, np.where(values <= -st, -1.0, 0.0)).astype(np.float32)
+        if options['accumulate']:
+            delta = np.diff(values, axis=0, prepend=self.post_in[None])
+            rise = np.maximum(delta, 0)
+            self.post_in = values[-1]
+            values = np.cumsum(delta + rise if options['additive'] else rise, axis=0) + self.post_out
+            self.post_out = values[-1]
+        elif options['additive']:
+            values = np.cumsum(values, axis=0) + self.post_out
+            self.post_out = values[-1]
+        return values.astype(np.float32)
+
+    def feed_magnitudes(self, mags):
+        return self._post(self._resample(self._envelope(mags), False))
+
+    def feed(self, samples):
+        return self.feed_magnitudes(self.stft.feed(samples))
+
+    def finish(self, mags=None):
+        if mags is None:
+            mags = self.stft.finish()
+        return self._post(self._resample(self._envelope(mags), True))
+
+
+def bake_stream(filepath, edges, fps, attack=0.005, release=0.2, threshold=0.0,
+                accumulate=False, additive=False, square=False, sthreshold=0.1,
+                fft_size=FFT_SIZE, hop=HOP, cache=None, out_path=None, chunk=CHUNK_SAMPLES):
+    """
+    bake() for long files with memory use independent of their length
+    Samples are streamed in chunks (wav is memory mapped), or the cached
+    spectrogram is read block by block. With out_path the values are written
+    to that raw float32 file and returned memory mapped.
+    :return: (frames, bands) float32 array
+    """
+    options = dict(attack=attack, release=release, threshold=threshold,
+                   accumulate=accumulate, additive=additive, square=square,
+                   sthreshold=sthreshold, fft_size=fft_size, hop=hop)
+    blocks = []
+    out = open(out_path, 'wb') if out_path else None
+    count = 0
+
+    def emit(values):
+        if out is not None:
+            out.write(np.ascontiguousarray(values, dtype=np.float32).tobytes())
+        elif len(values):
+            blocks.append(values)
+        return len(values)
+
+    try:
+        if cache is not None:
+            spectrogram, rate = cache.get(filepath, fft_size, hop)
+            stream = EnvelopeStream(rate, edges, fps, **options)
+            for start in range(0, len(spectrogram), BLOCK_FRAMES):
+                mag = np.asarray(spectrogram[start:start + BLOCK_FRAMES], dtype=np.float32)
+                count += emit(stream.feed_magnitudes([mag]))
+            count += emit(stream.finish([]))
+        else:
+            rate, chunks = open_stream(filepath, chunk)
+            stream = EnvelopeStream(rate, edges, fps, **options)
+            for samples in chunks:
+                count += emit(stream.feed(samples))
+            count += emit(stream.finish())
+    finally:
+        if out is not None:
+            out.close()
+    if out is not None:
+        return np.memmap(out_path, dtype=np.float32, mode='r', shape=(count, len(edges)))
+    if not blocks:
+        return np.zeros((0, len(edges)), dtype=np.float32)
+    return np.concatenate(blocks)
+
+
+class LivePreview(object):
+    """
+    Envelope values at a moving playhead for previews, without baking
+    A background thread analyses the STFT frames around the playhead into a
+    ring buffer of band amplitudes. values() runs the envelope follower over
+    the last few attack/release times before the playhead, which is where
+    its state comes from, and computes frames the thread hasn't reached yet
+    itself, so a seek never waits for the thread.
+    """
+
+    def __init__(self, filepath, edges, seconds=10.0, fft_size=FFT_SIZE, hop=HOP):
+        try:
+            data, rate, width = wav_memmap(filepath)
+            self.read = lambda lo, hi: _mono(data[lo:hi], width)
+            self.length = len(data)
+        except (ValueError, struct.error):
+            samples, rate = load_audio(filepath)
+            self.read = lambda lo, hi: samples[lo:hi]
+            self.length = len(samples)
+        self.rate = rate
+        self.fft_size = fft_size
+        self.hop = hop
+        self.frame_rate = rate / float(hop)
+        self.bank = filterbank(edges, rate, fft_size)
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self.scale = math.sqrt(2.0 * 2.0 / (fft_size * np.sum(self.window ** 2)))
+        self.total = self.length // hop + 1
+        self.capacity = max(BLOCK_FRAMES, int(seconds * self.frame_rate))
+        self.ring = np.zeros((self.capacity, len(edges)), dtype=np.float32)
+        # frames [first, last) are in the ring, frame f at f % capacity
+        self.first = self.last = 0
+        self.playhead = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def analyse(self, first, count):
+        """
+        Band amplitudes of count frames from frame first
+        """
+        lo = first * self.hop - self.fft_size // 2
+        hi = lo + (count - 1) * self.hop + self.fft_size
+        segment = np.zeros(hi - lo, dtype=np.float32)
+        s0 = max(lo, 0)
+        s1 = min(hi, self.length)
+        if s1 > s0:
+            segment[s0 - lo:s1 - lo] = self.read(s0, s1)
+        stride = segment.strides[0]
+        frames = np.lib.stride_tricks.as_strided(
+            segment, shape=(count, self.fft_size), strides=(self.hop * stride, stride))
+        return self.bank.apply(np.abs(np.fft.rfft(frames * self.window, axis=1)) * self.scale)
+
+    def _fill(self):
+        with self.lock:
+            playhead = self.playhead
+            if not (self.first <= playhead <= self.last):
+                # seek outside the buffer, start over behind the playhead
+                self.first = self.last = max(0, playhead - self.capacity // 4)
+            end = min(self.total, self.first + self.capacity, playhead + self.capacity * 3 // 4)
+            start = self.last
+        if start >= end:
+            return False
+        count = min(end - start, 256)
+        values = self.analyse(start, count)
+        with self.lock:
+            if self.last != start:
+                return True
+            rows = np.arange(start, start + count) % self.capacity
+            self.ring[rows] = values
+            self.last = start + count
+            self.first = max(self.first, self.last - self.capacity)
+        return True
+
+    def _run(self):
+        while self.running:
+            if not self._fill():
+                self.wake.wait(0.05)
+                self.wake.clear()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="gx-preview", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def amplitudes(self, first, last):
+        """
+        (last - first, bands) amplitudes, from the ring where available
+        """
+        with self.lock:
+            lo = max(first, self.first)
+            hi = min(last, self.last)
+            cached = self.ring[np.arange(lo, hi) % self.capacity] if hi > lo else None
+        if cached is None:
+            return self.analyse(first, last - first)
+        parts = []
+        if lo > first:
+            parts.append(self.analyse(first, lo - first))
+        parts.append(cached)
+        if last > hi:
+            parts.append(self.analyse(hi, last - hi))
+        return np.concatenate(parts)
+
+    def values(self, seconds, attack=0.005, release=0.2, threshold=0.0, square=False, sthreshold=0.1):
+        """
+        Envelope of every band at a time in the sound
+        accumulate/additive depend on the whole history and aren't previewed.
+        """
+        frame = min(max(0, int(seconds * self.frame_rate)), self.total - 1)
+        with self.lock:
+            self.playhead = frame
+        self.wake.set()
+        # the follower forgets its start after a few attack/release times
+        warmup = int(3 * max(attack, release, 1.0 / self.frame_rate) * self.frame_rate) + 1
+        first = max(0, frame - warmup)
+        amplitudes = self.amplitudes(first, frame + 1)
+        values = envelope(amplitudes, self.frame_rate, attack, release, threshold)[-1]
+        if square:
+            values = np.where(values >= sthreshold, 1.0, np.where(values <= -sthreshold, -1.0, 0.0))
+        return values.astype(np.float32)
+
+
+def bake(filepath, edges, fps, attack=0.005, release=0.2, threshold=0.0,
+         accumulate=False, additive=False, square=False, sthreshold=0.1,
+         fft_size=FFT_SIZE, hop=HOP, cache=None):
+    """
+    Envelopes of all bands of one sound file, one value per frame
+    :param cache: optional SpectrumCache to read/store the spectrogram
+    :return: (frames, bands) float32 array
+    """
+    if cache is not None:
+        spectrogram, rate = cache.get(filepath, fft_size, hop)
+        amplitudes, frame_rate = spectrogram_band_amplitudes(spectrogram, rate, edges, fft_size, hop)
+    else:
+        samples, rate = load_audio(filepath)
+        amplitudes, frame_rate = band_amplitudes(samples, rate, edges, fft_size, hop)
+    values = envelope(amplitudes, frame_rate, attack, release, threshold)
+    values = resample(values, frame_rate, fps)
+    return post_process(values, square, sthreshold, accumulate, additive).astype(np.float32)
+
+
+def _attach(desc):
+    name, shape, dtype = desc
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _share(shape, dtype, data=None):
+    size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    if data is not None:
+        array[:] = data
+    return shm, array, (shm.name, shape, np.dtype(dtype).str)
+
+
+def _amplitude_task(source, rate, edges, fft_size, hop, out_desc, first, last):
+    """
+    Worker: band amplitudes of frames [first, last) into the shared output
+    source is ('samples', shared desc) or ('spectrogram', cached .npy path).
+    """
+    bank = filterbank(edges, rate, fft_size)
+    shm_out, out = _attach(out_desc)
+    shm_in = None
+    try:
+        if source[0] == 'samples':
+            shm_in, samples = _attach(source[1])
+            for start, mag in spectrogram_blocks(samples, fft_size, hop, first, last):
+                out[start:start + len(mag)] = bank.apply(mag)
+        else:
+            spectrogram = np.load(source[1], mmap_mode='r')
+            for start in range(first, last, BLOCK_FRAMES):
+                mag = np.asarray(spectrogram[start:min(start + BLOCK_FRAMES, last)],
+                                 dtype=np.float32)
+                out[start:start + len(mag)] = bank.apply(mag)
+    finally:
+        if shm_in is not None:
+            shm_in.close()
+        shm_out.close()
+
+
+def _envelope_task(amp_desc, out_desc, lo, hi, frame_rate, fps, options):
+    """
+    Worker: envelope, resampling and post processing of bands [lo, hi)
+    """
+    shm_amp, amplitudes = _attach(amp_desc)
+    shm_out, out = _attach(out_desc)
+    try:
+        values = envelope(np.array(amplitudes[:, lo:hi]), frame_rate, options['attack'],
+                          options['release'], options['threshold'])
+        values = resample(values, frame_rate, fps)
+        out[:, lo:hi] = post_process(values, options['square'], options['sthreshold'],
+                                     options['accumulate'], options['additive'])
+    finally:
+        shm_amp.close()
+        shm_out.close()
+
+
+def _chunks(total, parts):
+    step = max(1, -(-total // max(1, parts)))
+    return [(lo, min(lo + step, total)) for lo in range(0, total, step)]
+
+
+def _spawn_python():
+    """
+    Inside Blender the interpreter to spawn workers with, None elsewhere
+    Its multithreaded process mustn't be forked. Up to 2.90 sys.executable
+    is Blender itself and bpy.app.binary_path_python the bundled Python.
+    """
+    bpy = sys.modules.get('bpy')
+    if bpy is None:
+        return None
+    return getattr(bpy.app, 'binary_path_python', '') or sys.executable
+
+
+def _executor(workers, python=None):
+    """
+    Process pool, its workers spawned with python when given
+    Spawned workers can't import aud: they get the decoded samples through
+    shared memory, cached spectrograms or wav files, never other formats.
+    """
+    if python is None:
+        return ProcessPoolExecutor(max_workers=workers)
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(python)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def _is_wav(filepath):
+    try:
+        wav_memmap(filepath)
+    except Exception:
+        return False
+    return True
+
+
+def bake_many(filepaths, edges, fps, attack=0.005, release=0.2, threshold=0.0,
+              accumulate=False, additive=False, square=False, sthreshold=0.1,
+              fft_size=FFT_SIZE, hop=HOP, cache=None, workers=None, stream=None):
+    """
+    bake() of several sound files (eg. left and right channel) on a process pool
+    Audio and intermediate arrays live in shared memory. The STFT is split
+    into frame ranges and the envelopes into band groups, and the workers
+    of all files share one pool. Only numpy arrays come back, writing them
+    into Blender data is left to the caller's main thread.
+    :param stream: bake with bake_stream instead of loading the files whole,
+        None to stream only files longer than STREAM_SECONDS
+    :param workers: pool size, all cores when None; callers running several
+        bakes at once should split the cores between them
+    :return: list of (frames, bands) arrays, None for files that failed
+    """
+    options = dict(attack=attack, release=release, threshold=threshold,
+                   accumulate=accumulate, additive=additive, square=square,
+                   sthreshold=sthreshold)
+    streamed = set(filepath for filepath in filepaths
+                   if stream or (stream is None and is_long(filepath)))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or shared_memory is None:
+        results = []
+        for filepath in filepaths:
+            try:
+                func = bake_stream if filepath in streamed else bake
+                results.append(func(filepath, edges, fps, fft_size=fft_size, hop=hop,
+                                    cache=cache, **options))
+            except Exception as e:
+                print("Bake failed for " + str(filepath) + ": " + str(e))
+                results.append(None)
+        return results
+
+    python = _spawn_python()
+    shared = []
+    jobs = []
+    try:
+        with _executor(workers, python) as pool, ThreadPoolExecutor(max_workers=1) as local:
+            # band amplitudes, split by frame range
+            futures = []
+            for filepath in filepaths:
+                if filepath in streamed:
+                    # one task per long file, memory stays bounded. Files
+                    # only aud decodes stream on a thread of this process.
+                    runner = local if python is not None and not _is_wav(filepath) else pool
+                    jobs.append(runner.submit(bake_stream, filepath, edges, fps, fft_size=fft_size,
+                                              hop=hop, cache=cache, **options))
+                    continue
+                try:
+                    if cache is not None:
+                        spectrogram, rate = cache.get(filepath, fft_size, hop)
+                        count = len(spectrogram)
+                        source = ('spectrogram', spectrogram.filename)
+                        del spectrogram
+                    else:
+                        samples, rate = load_audio(filepath)
+                        count = frame_count(samples, hop)
+                        shm, _, desc = _share(samples.shape, np.float32, samples)
+                        shared.append(shm)
+                        source = ('samples', desc)
+                        del samples
+                except Exception as e:
+                    print("Bake failed for " + str(filepath) + ": " + str(e))
+                    jobs.append(None)
+                    continue
+                shm, _, amp_desc = _share((count, len(edges)), np.float32)
+                shared.append(shm)
+                for first, last in _chunks(count, workers * 2):
+                    futures.append(pool.submit(_amplitude_task, source, rate, edges,
+                                               fft_size, hop, amp_desc, first, last))
+                jobs.append((amp_desc, count, rate / float(hop)))
+            for future in futures:
+                future.result()
+
+            # envelopes, split by band group
+            futures = []
+            outputs = []
+            for job in jobs:
+                if job is None or isinstance(job, Future):
+                    outputs.append(job)
+                    continue
+                amp_desc, count, frame_rate = job
+                frames = int(math.ceil(count * fps / frame_rate))
+                shm, out, out_desc = _share((frames, len(edges)), np.float32)
+                shared.append(shm)
+                outputs.append(out)
+                for lo, hi in _chunks(len(edges), workers):
+                    futures.append(pool.submit(_envelope_task, amp_desc, out_desc, lo, hi,
+                                               frame_rate, fps, options))
+            for future in futures:
+                future.result()
+            results = []
+            for filepath, out in zip(filepaths, outputs):
+                if isinstance(out, Future):
+                    try:
+                        out = out.result()
+                    except Exception as e:
+                        print("Bake failed for " + str(filepath) + ": " + str(e))
+                        out = None
+                results.append(None if out is None else np.array(out))
+            return results
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
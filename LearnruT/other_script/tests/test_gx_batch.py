@@ -0,0 +1,69 @@
+"""
+Checks of the npz side of the batch bake, on generated WAV files
+
+    python -m unittest discover -s LearnruT/other_script/tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gx_batch
+from test_gx_spectrum import write_wav
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        t = np.arange(44100) / 44100.0
+        write_wav(os.path.join(self.dir, 'l.wav'), 0.5 * np.sin(2 * np.pi * 440 * t))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def manifest(self, data):
+        path = os.path.join(self.dir, 'album.json')
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return path
+
+    def run_jobs(self, jobs):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            return gx_batch.run_jobs(jobs, lambda job: pool.submit(gx_batch.bake_npz, job), 2)
+
+    def test_preset_keys(self):
+        jobs = gx_batch.load_manifest(self.manifest(
+            {'defaults': {'count': 8}, 'jobs': [{'left': 'l.wav', 'preset': {'channels': 1}}]}))
+        self.assertEqual(jobs[0]['preset']['count'], 8)
+        self.assertEqual(gx_batch.SCENE_PROPS['count'], 'gx_count_x')
+        self.assertRaises(ValueError, gx_batch.load_manifest, self.manifest(
+            {'jobs': [{'left': 'l.wav', 'preset': {'cuont': 8}}]}))
+
+    def test_bake(self):
+        jobs = gx_batch.load_manifest(self.manifest(
+            {'defaults': {'count': 8}, 'jobs': [{'name': 'mono', 'left': 'l.wav', 'preset': {'channels': 1}}]}))
+        report = self.run_jobs(jobs)
+        self.assertEqual(report[0]['status'], 'ok')
+        with np.load(report[0]['output']) as data:
+            self.assertEqual(data['left'].shape[1], 8)
+            self.assertNotIn('right', data)
+
+    def test_missing_channel_file_fails(self):
+        # channels 0 bakes both sides, the manifest only has the left one
+        jobs = gx_batch.load_manifest(self.manifest(
+            {'jobs': [{'name': 'half', 'left': 'l.wav'}]}))
+        report = self.run_jobs(jobs)
+        self.assertEqual(report[0]['status'], 'failed')
+        self.assertIn('right', report[0]['error'])
+        self.assertFalse(os.path.exists(jobs[0]['output'] + '.npz'))
+
+
+if __name__ == '__main__':
+    unittest.main()
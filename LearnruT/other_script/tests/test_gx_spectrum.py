@@ -0,0 +1,188 @@
+"""
+Checks of the bpy-free bake engine, on generated WAV files
+
+    python -m unittest discover -s LearnruT/other_script/tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+import unittest
+import wave
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gx_spectrum
+
+
+def write_wav(path, samples, rate=44100):
+    pcm = (np.clip(samples, -1, 1) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+
+
+class SweepTest(unittest.TestCase):
+    """
+    A tone sweeping up and switching on and off, over some noise
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        rate = 44100
+        t = np.arange(rate * 3) / float(rate)
+        tone = np.sin(2 * np.pi * (200 + 400 * t) * t) * (np.sin(2 * np.pi * 0.7 * t) > 0)
+        noise = np.random.RandomState(0).uniform(-0.1, 0.1, len(t))
+        cls.wav = os.path.join(cls.dir, 'sweep.wav')
+        write_wav(cls.wav, 0.5 * tone + noise, rate)
+        cls.edges = gx_spectrum.band_edges(2, 16, 10.0, 20000.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+
+class BakeTest(SweepTest):
+
+    def test_frames_per_second(self):
+        for fps in (24.0, 30.0):
+            values = gx_spectrum.bake(self.wav, self.edges, fps)
+            self.assertEqual(values.shape[1], len(self.edges))
+            self.assertLessEqual(abs(len(values) - 3 * fps), 1)
+            self.assertEqual(values.dtype, np.float32)
+
+    def test_tone_lands_in_its_band(self):
+        rate = 44100
+        t = np.arange(rate) / float(rate)
+        tone = os.path.join(self.dir, 'tone.wav')
+        write_wav(tone, 0.5 * np.sin(2 * np.pi * 1000.0 * t), rate)
+        values = gx_spectrum.bake(tone, self.edges, 24.0)
+        band = [i for i, (lo, hi) in enumerate(self.edges) if lo <= 1000.0 < hi][0]
+        self.assertEqual(int(np.argmax(values[len(values) // 2])), band)
+
+
+class CacheTest(SweepTest):
+
+    def test_cached_bake(self):
+        cache = gx_spectrum.SpectrumCache(os.path.join(self.dir, 'cache'))
+        whole = gx_spectrum.bake(self.wav, self.edges, 24.0)
+        # float16 spectrograms, so close rather than equal
+        first = gx_spectrum.bake(self.wav, self.edges, 24.0, cache=cache)
+        second = gx_spectrum.bake(self.wav, self.edges, 24.0, cache=cache)
+        np.testing.assert_allclose(first, whole, atol=1e-3)
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(len([name for name in os.listdir(cache.directory) if name.endswith('.npy')]), 1)
+        leftovers = [name for name in os.listdir(cache.directory) if name.endswith('.tmp')]
+        self.assertEqual(leftovers, [])
+
+    def test_key_follows_settings(self):
+        cache = gx_spectrum.SpectrumCache(os.path.join(self.dir, 'keys'))
+        self.assertEqual(cache.key(self.wav), cache.key(self.wav))
+        self.assertNotEqual(cache.key(self.wav), cache.key(self.wav, hop=512))
+
+    def test_eviction(self):
+        cache = gx_spectrum.SpectrumCache(os.path.join(self.dir, 'small'), max_bytes=1)
+        cache.get(self.wav)
+        cache.get(self.wav, hop=512)
+        # over the limit, only the entry just filled stays
+        kept = [name for name in os.listdir(cache.directory) if name.endswith('.npy')]
+        self.assertEqual(kept, [cache.key(self.wav, hop=512) + '.npy'])
+
+
+class StreamTest(SweepTest):
+
+    def test_stream_matches_bake(self):
+        whole = gx_spectrum.bake(self.wav, self.edges, 24.0)
+        streamed = gx_spectrum.bake_stream(self.wav, self.edges, 24.0)
+        self.assertEqual(whole.shape, streamed.shape)
+        self.assertEqual(whole.shape[1], len(self.edges))
+        np.testing.assert_allclose(streamed, whole, atol=1e-5)
+
+    def test_stream_matches_bake_with_options(self):
+        options = dict(attack=0.05, release=0.5, threshold=0.01, square=True, accumulate=True)
+        whole = gx_spectrum.bake(self.wav, self.edges, 30.0, **options)
+        streamed = gx_spectrum.bake_stream(self.wav, self.edges, 30.0, **options)
+        np.testing.assert_allclose(streamed, whole, atol=1e-5)
+
+    def test_frame_count(self):
+        for n in (0, 1, 255, 256, 257, 10 ** 10):
+            self.assertEqual(gx_spectrum.frame_count_n(n, 256), max(1, (n + 255) // 256))
+        self.assertEqual(gx_spectrum.frame_count(np.zeros(513), 256), 3)
+
+    def test_memory_independent_of_length(self):
+        long_wav = os.path.join(self.dir, 'long.wav')
+        length = 1 << 22
+        write_wav(long_wav, np.random.RandomState(1).uniform(-0.1, 0.1, length))
+        cache = gx_spectrum.SpectrumCache(os.path.join(self.dir, 'memory_cache'))
+        for run in (lambda: cache.get(long_wav, 256, 128),
+                    lambda: gx_spectrum.bake_stream(long_wav, self.edges, 24.0, fft_size=256, hop=128,
+                                                    out_path=os.path.join(self.dir, 'long.raw'))):
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            # well below a float32 copy of the whole file
+            self.assertLess(peak, length * 4)
+
+    def test_failed_fill_leaves_no_temp_file(self):
+        cache = gx_spectrum.SpectrumCache(os.path.join(self.dir, 'failing_cache'))
+
+        def broken(filepath, chunk=gx_spectrum.CHUNK_SAMPLES):
+            def read():
+                yield np.zeros(4096, np.float32)
+                raise IOError('truncated file')
+            return 44100, read()
+
+        with mock.patch.object(gx_spectrum, 'open_stream', broken):
+            self.assertRaises(IOError, cache.get, self.wav)
+        leftovers = [name for name in os.listdir(cache.directory) if name.endswith(('.tmp', '.npy'))]
+        self.assertEqual(leftovers, [])
+
+
+class BakeManyTest(SweepTest):
+
+    def test_bake_many(self):
+        whole = gx_spectrum.bake(self.wav, self.edges, 24.0)
+        missing = os.path.join(self.dir, 'missing.wav')
+        for workers in (1, 2):
+            results = gx_spectrum.bake_many([self.wav, missing], self.edges, 24.0, workers=workers)
+            np.testing.assert_allclose(results[0], whole, atol=1e-5)
+            self.assertIsNone(results[1])
+
+    def test_bake_many_spawned(self):
+        # the workers Blender gets: spawned, samples through shared memory
+        whole = gx_spectrum.bake(self.wav, self.edges, 24.0)
+        with mock.patch.object(gx_spectrum, '_spawn_python', return_value=sys.executable):
+            results = gx_spectrum.bake_many([self.wav, self.wav], self.edges, 24.0, workers=2,
+                                            stream=False)
+            streamed = gx_spectrum.bake_many([self.wav], self.edges, 24.0, workers=2, stream=True)
+        for result in results + streamed:
+            np.testing.assert_allclose(result, whole, atol=1e-5)
+
+
+class DecimateTest(SweepTest):
+
+    def test_decimate_within_tolerance(self):
+        values = gx_spectrum.bake(self.wav, self.edges, 24.0)[:, 3]
+        keys = gx_spectrum.decimate(values, 0.01)
+        self.assertEqual(keys[0], 0)
+        self.assertEqual(keys[-1], len(values) - 1)
+        self.assertLess(len(keys), len(values))
+        rebuilt = np.interp(np.arange(len(values)), keys, values[keys])
+        self.assertLessEqual(np.abs(rebuilt - values).max(), 0.01 + 1e-6)
+
+    def test_no_tolerance_keeps_every_key(self):
+        values = np.random.RandomState(2).uniform(size=50).astype(np.float32)
+        np.testing.assert_array_equal(gx_spectrum.decimate(values, 0), np.arange(50))
+
+
+if __name__ == '__main__':
+    unittest.main()
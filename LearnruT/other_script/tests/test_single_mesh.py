@@ -0,0 +1,86 @@
+"""
+Bar heights of the 'Single mesh' visualisation, needs Blender's bpy and is
+skipped without it
+
+    blender -b --factory-startup --python LearnruT/other_script/tests/test_single_mesh.py
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@unittest.skipIf(bpy is None, "needs Blender")
+class SingleMeshTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import audio_visualisation
+        cls.av = audio_visualisation
+        audio_visualisation.register()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.av.unregister()
+
+    def setUp(self):
+        scene = bpy.context.scene
+        self.av.initpropvalues()
+        scene['gx_type'] = 3
+        scene['gx_channels'] = 0
+        scene['gx_count_x'] = 4
+        self.obj = self.av.build_bar_mesh()
+
+    def tearDown(self):
+        self.av.remove_bar_mesh()
+
+    def coords(self, data):
+        co = np.empty(len(data) * 3, dtype=np.float32)
+        data.foreach_get('co', co)
+        return co.reshape(-1, 8, 3)
+
+    def test_one_key_per_bar(self):
+        names = [kb.name for kb in self.av.bar_keys(self.obj)]
+        self.assertEqual(names, ['bar_l_1', 'bar_l_2', 'bar_l_3', 'bar_l_4',
+                                 'bar_r_1', 'bar_r_2', 'bar_r_3', 'bar_r_4'])
+
+    def test_heights(self):
+        scene = bpy.context.scene
+        rest = self.coords(self.obj.data.vertices)
+        np.testing.assert_allclose(rest[:, 4:, 2], self.av.BAR_HEIGHT * scene['gx_cube_scale_z'], rtol=1e-5)
+        for index, kb in enumerate(self.av.bar_keys(self.obj)):
+            shaped = self.coords(kb.data)
+            # a key at 1.0 raises its own bar as far as a driven bar at an envelope of 1.0
+            np.testing.assert_allclose(shaped[index, 4:, 2] - rest[index, 4:, 2],
+                                       self.av.BAR_HEIGHT * scene['gx_driver_power'], rtol=1e-5)
+            others = np.arange(len(rest)) != index
+            np.testing.assert_array_equal(shaped[others], rest[others])
+
+    def test_power_reshapes_keys(self):
+        scene = bpy.context.scene
+        scene['gx_driver_power'] = 5.0
+        self.av.set_bar_rise(self.obj)
+        rest = self.coords(self.obj.data.vertices)
+        shaped = self.coords(self.av.bar_keys(self.obj)[2].data)
+        np.testing.assert_allclose(shaped[2, 4:, 2] - rest[2, 4:, 2], self.av.BAR_HEIGHT * 5.0, rtol=1e-5)
+
+    def test_rebuild_keeps_animation(self):
+        values = np.linspace(0, 1, 10).astype(np.float32)
+        self.av.write_bar_values([('bar_l_', 1, values, np.arange(len(values)))], 1)
+        bpy.context.scene['gx_count_x'] = 6
+        obj = self.av.build_bar_mesh()
+        key = obj.data.shape_keys
+        self.assertEqual(len(self.av.bar_keys(obj)), 12)
+        self.assertIsNotNone(key.animation_data.action.fcurves.find('key_blocks["bar_l_2"].value'))
+
+
+if __name__ == '__main__':
+    unittest.main(argv=[sys.argv[0]])